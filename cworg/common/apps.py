@@ -1,6 +1,19 @@
 from django.apps import AppConfig
+from django.db.models.signals import m2m_changed, post_delete, post_save
 
 
 class CommonConfig(AppConfig):
     name = 'common'
+
+    def ready(self):
+        from .cache import model_changed_receiver, row_deleted_receiver
+        from .sitemodule import module_registry
+        post_save.connect(model_changed_receiver, dispatch_uid='common.cache.post_save')
+        post_delete.connect(model_changed_receiver, dispatch_uid='common.cache.post_delete')
+        m2m_changed.connect(model_changed_receiver, dispatch_uid='common.cache.m2m_changed')
+        post_delete.connect(row_deleted_receiver, dispatch_uid='common.cache.row_deleted')
+        # Every app config is registered by now.
+        module_registry.freeze()
+        pass
+
     pass
@@ -0,0 +1,198 @@
+"""Caching helpers for the site modules.
+
+Every database table has a version number kept in the django cache.
+The version changes whenever a row of the table is saved or deleted,
+so cached data derived from the table can carry the versions in its
+cache key and goes stale by itself. Rows of the models shown in the
+cached list pages have their own versions as well.
+
+The table versions have to be shared by all the server processes for
+the invalidation to work. With a cache local to the process (locmem,
+dummy) the cached counts, rows and ETags are not used at all, see
+`is_cache_shared()`.
+"""
+import hashlib
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache, DEFAULT_CACHE_ALIAS
+from django.core.exceptions import EmptyResultSet
+from django.db import connections, transaction
+
+from cwlog import logger
+
+TABLE_VERSION_KEY = 'cworg:table-version:{}'
+COUNT_KEY = 'cworg:count:{}'
+COUNT_TIMEOUT = 300
+ROW_VERSION_KEY = 'cworg:row-version:{}:{}'
+
+
+# Backends keeping the cache in the process. A version bumped by one
+# worker would not be seen by the others.
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def is_cache_shared():
+    """Whether the default cache is shared by all the server processes.
+
+    The data cached across the requests is only valid when it is.
+    """
+    backend = settings.CACHES.get(DEFAULT_CACHE_ALIAS, {}).get('BACKEND')
+    return backend not in LOCAL_CACHE_BACKENDS
+
+
+def _new_version():
+    # Versions restart from the clock, so a version evicted from the
+    # cache never comes back with an old value.
+    return int(time.time() * 1000)
+
+
+def get_table_versions(tables):
+    """Return the versions of the tables as a dict."""
+    keys = {TABLE_VERSION_KEY.format(table): table for table in tables}
+    versions = cache.get_many(list(keys))
+    for key, table in keys.items():
+        if key not in versions:
+            cache.add(key, _new_version(), None)
+            versions[key] = cache.get(key)
+            pass
+        pass
+    return {table: versions[key] for key, table in keys.items()}
+
+
+def _bump_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _new_version(), None)
+        pass
+    pass
+
+
+def bump_table_version(table):
+    """Mark the table changed, once the transaction is committed.
+
+    Bumping the version before the commit would let a concurrent
+    request cache the old rows or count under the new version.
+    """
+    key = TABLE_VERSION_KEY.format(table)
+    transaction.on_commit(lambda: _bump_version(key))
+    pass
+
+
+def bump_model_version(model):
+    """Mark the model table changed.
+
+    Bulk operations, like `bulk_create()` or `QuerySet.update()`, do
+    not send the model signals and have to call this explicitly.
+    """
+    bump_table_version(model._meta.db_table)
+    pass
+
+
+def model_changed_receiver(sender, **kwargs):
+    """Bump the table version on the model save and delete signals."""
+    action = kwargs.get('action')
+    if action is not None and not action.startswith('post_'):
+        # m2m_changed is sent before and after the change
+        return
+    bump_model_version(sender)
+    pass
+
+
+def get_row_versions(model, pks):
+    """Return the versions of the model rows as a dict keyed by pk."""
+    table = model._meta.db_table
+    keys = {ROW_VERSION_KEY.format(table, pk): pk for pk in pks}
+    versions = cache.get_many(list(keys))
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _new_version(), None)
+            versions[key] = cache.get(key)
+            pass
+        pass
+    return {pk: versions[key] for key, pk in keys.items()}
+
+
+def bump_row_version(model, pk):
+    """Mark the model row changed, once the transaction is committed.
+
+    Bumping the version before the commit would let a concurrent
+    request cache the old row under the new version.
+    """
+    if pk is None:
+        return
+    key = ROW_VERSION_KEY.format(model._meta.db_table, pk)
+    transaction.on_commit(lambda: _bump_version(key))
+    pass
+
+
+def row_deleted_receiver(sender, instance, **kwargs):
+    """Bump the row version on the model delete signal."""
+    bump_row_version(sender, instance.pk)
+    pass
+
+
+def get_query_tables(queryset, sql):
+    """Return the tables used by the queryset SQL."""
+    quote_name = connections[queryset.db].ops.quote_name
+    tables = {queryset.model._meta.db_table}
+    for model in apps.get_models(include_auto_created=True):
+        table = model._meta.db_table
+        if table not in tables and quote_name(table) in sql:
+            tables.add(table)
+            pass
+        pass
+    return sorted(tables)
+
+
+def cached_count(queryset, timeout=COUNT_TIMEOUT):
+    """Return `queryset.count()` cached until a table of the query changes.
+
+    The cache key is made from the queryset SQL, the parameters and
+    the versions of the tables the SQL refers to. The count is not
+    cached without a shared cache.
+    """
+    try:
+        sql, params = queryset.query.sql_with_params()
+    except EmptyResultSet:
+        return 0
+    if not is_cache_shared():
+        return queryset.count()
+    versions = get_table_versions(get_query_tables(queryset, sql))
+    digest = hashlib.md5(repr((queryset.db, sql, params, sorted(versions.items()))).encode('utf-8'))
+    key = COUNT_KEY.format(digest.hexdigest())
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, timeout)
+        pass
+    return count
+
+
+def estimate_count(model, using='default'):
+    """Return the table row count estimate from the database statistics.
+
+    Returns None when the database backend has no statistics for it.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    if connection.vendor == 'mysql':
+        sql = ("SELECT TABLE_ROWS FROM information_schema.TABLES"
+               " WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s")
+    elif connection.vendor == 'postgresql':
+        sql = "SELECT reltuples FROM pg_class WHERE relname = %s"
+    else:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [table])
+        row = cursor.fetchone()
+        pass
+    if row is None or row[0] is None or row[0] < 0:
+        logger.debug("No row count statistics for {}".format(table))
+        return None
+    return int(row[0])
@@ -12,6 +12,7 @@ class DatatableRequestForm(forms.Form):
     draw = forms.IntegerField()
     start = forms.IntegerField()
     length = forms.IntegerField()
+    cursor = forms.CharField(required=False)
 
     def clean_ordering(self):
         order = {}
@@ -25,6 +26,11 @@ class DatatableRequestForm(forms.Form):
 
         self.cleaned_data['ordering'] = [spec[1] for spec in sorted(order.items())]
 
+    def clean_search(self):
+        value = self.data.get('datatable-search[value]', '')
+        self.cleaned_data['search'] = value.strip()
+
     def clean(self):
         self.clean_ordering()
+        self.clean_search()
         return self.cleaned_data
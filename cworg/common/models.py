@@ -1,4 +1,174 @@
-from django.db import models
+import itertools
+import os
+
+from django.db import models, transaction, IntegrityError
+
+from common.constant import REST_KEYWORDS
 
 # Create your models here.
 
+SLUG_SUFFIX_ROOM = 6
+
+
+def _get_taken_slugs(model, bases, reserved=(), exclude=()):
+    max_length = model._meta.get_field('slug').max_length
+    stem = os.path.commonprefix([base[:max_length - SLUG_SUFFIX_ROOM] for base in bases])
+    taken = set(model._default_manager.filter(slug__startswith=stem).values_list('slug', flat=True))
+    taken.update(REST_KEYWORDS, reserved, exclude)
+    return taken
+
+
+def _iter_free_slugs(base, taken, max_length):
+    if base not in taken:
+        yield base
+        pass
+    for n in itertools.count(2):
+        suffix = "-%d" % n
+        slug = base[:max_length - len(suffix)] + suffix
+        if slug not in taken:
+            yield slug
+            pass
+        pass
+    pass
+
+
+def allocate_slugs(model, base, count=1, reserved=(), exclude=()):
+    """Return count free slugs of the model starting with the base slug.
+
+    The slugs in use are fetched with one prefix query on the unique slug
+    index, and the free ones are the base itself followed by "base-2",
+    "base-3", ... The REST keywords, the reserved words and the exclude
+    slugs are never returned. A slug may still be taken by a concurrent
+    insert, which the unique constraint catches (see SlugModelMixin).
+    """
+    max_length = model._meta.get_field('slug').max_length
+    base = base[:max_length] or model._meta.model_name
+    taken = _get_taken_slugs(model, [base], reserved, exclude)
+    return list(itertools.islice(_iter_free_slugs(base, taken, max_length), count))
+
+
+def allocate_distinct_slugs(model, bases, reserved=()):
+    """Return a free slug for each of the base slugs, all different.
+
+    The slugs in use are fetched with one query on the common prefix of
+    the bases, as in `allocate_slugs`.
+    """
+    max_length = model._meta.get_field('slug').max_length
+    bases = [base[:max_length] or model._meta.model_name for base in bases]
+    if not bases:
+        return []
+    taken = _get_taken_slugs(model, bases, reserved)
+    slugs = []
+    for base in bases:
+        slug = next(_iter_free_slugs(base, taken, max_length))
+        taken.add(slug)
+        slugs.append(slug)
+        pass
+    return slugs
+
+
+def allocate_slug(model, base, reserved=()):
+    """Return a free slug of the model starting with the base slug."""
+    return allocate_slugs(model, base, reserved=reserved)[0]
+
+
+class SlugModelMixin:
+    """Model mixin allocating the slug of a new row when it is saved.
+
+    The model sets slug_reserved to the words used in its URLs and
+    implements get_slug_base. When a concurrent insert takes the same
+    slug, the unique constraint fails and the save is retried with a new
+    slug, slug_retries times at most.
+    """
+    slug_reserved = ()
+    slug_retries = 5
+
+    def get_slug_base(self):
+        raise NotImplementedError
+
+    def allocate_slug(self):
+        return allocate_slug(type(self), self.get_slug_base(), reserved=self.slug_reserved)
+
+    def save(self, *args, **kwargs):
+        if self.slug:
+            return super().save(*args, **kwargs)
+
+        for attempt in range(self.slug_retries):
+            self.slug = self.allocate_slug()
+            try:
+                # The savepoint keeps an outer transaction usable after
+                # the failed insert.
+                with transaction.atomic(using=kwargs.get('using')):
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                taken = type(self)._default_manager.filter(slug=self.slug).exclude(pk=self.pk).exists()
+                if not taken or attempt + 1 == self.slug_retries:
+                    raise
+                self.slug = ''
+                pass
+            pass
+        pass
+
+    pass
+
+
+class ChangeTrackingMixin:
+    """Model mixin remembering the field values loaded from the database.
+
+    `has_changed()` tells if fields differ from the loaded values, so the
+    save side effects can run only when the fields they depend on are
+    changed. The loaded values are taken again after every save. A row
+    not loaded from the database has all its fields changed.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):  # noqa D102
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def _get_attnames(self, names):
+        if not names:
+            return [field.attname for field in self._meta.concrete_fields]
+        return [self._meta.get_field(name).attname for name in names]
+
+    def get_loaded_value(self, name, default=None):
+        """Return the loaded value of the field."""
+        loaded = self.__dict__.get('_loaded_values') or {}
+        return loaded.get(self._meta.get_field(name).attname, default)
+
+    def get_changed_fields(self, *names):
+        """Return the attnames of the changed fields, of all fields by default."""
+        attnames = self._get_attnames(names)
+        loaded = self.__dict__.get('_loaded_values')
+        if loaded is None:
+            return set(attnames)
+        # Deferred fields not read since are not in __dict__.
+        return set(attname for attname in attnames
+                   if attname in self.__dict__
+                   and (attname not in loaded or self.__dict__[attname] != loaded[attname]))
+
+    def has_changed(self, *names):
+        """Whether any of the fields, or any field by default, is changed."""
+        return bool(self.get_changed_fields(*names))
+
+    def _keep_loaded_values(self, attnames):
+        loaded = self.__dict__.setdefault('_loaded_values', {})
+        for attname in attnames:
+            if attname in self.__dict__:
+                loaded[attname] = self.__dict__[attname]
+                pass
+            pass
+        pass
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._keep_loaded_values(self._get_attnames(kwargs.get('update_fields')))
+        pass
+
+    def refresh_from_db(self, using=None, fields=None):  # noqa D102
+        super().refresh_from_db(using=using, fields=fields)
+        self._keep_loaded_values(self._get_attnames(fields))
+        pass
+
+    pass
@@ -1,10 +1,12 @@
+import logging
+import re
 import warnings
 from importlib import import_module
 
 from django.apps import AppConfig, apps
 from django.template import Template, TemplateDoesNotExist
 from django.template.loader import get_template, select_template
-from django.urls import reverse, NoReverseMatch
+from django.urls import reverse, NoReverseMatch, get_script_prefix, get_urlconf
 from django.utils.module_loading import module_has_submodule
 
 from django.urls import URLResolver
@@ -48,11 +50,23 @@ class SiteModuleURLResolver(URLResolver):
 
 
 class SiteModuleRegistry(object):
-    """SiteModule registry."""
+    """SiteModule registry.
+
+    The sorted list of the enabled site modules is frozen once the apps
+    are loaded (see `freeze`), and the modules permitted for a user are
+    kept per permission fingerprint, so the menu of a request is a dict
+    lookup.
+    """
+
+    # Max number of the kept permitted module lists.
+    max_available = 256
 
     def __init__(self):
         self._registry = {}
         self._modules = {}
+        self._enabled = None
+        self._restricted = ()
+        self._available = {}
         pass
 
     def modules(self):
@@ -67,12 +81,41 @@ class SiteModuleRegistry(object):
         If the sitecomp instance have no `enabled` attribute, the
         sitecomp considered enabled.
         """
+        if self._enabled is not None:
+            return list(self._enabled)
         return [scomp for scomp in self.modules()
                 if getattr(scomp, 'enabled', True)]
 
     def available_modules(self, user):
         """List of site modules permitted for the user."""
-        return [sitecomp for sitecomp in self.enabled_modules() if sitecomp.has_perm(user)]
+        if self._enabled is None:
+            return [sitecomp for sitecomp in self.enabled_modules() if sitecomp.has_perm(user)]
+
+        fingerprint = tuple(sitecomp.get_perm_fingerprint(user) for sitecomp in self._restricted)
+        try:
+            return list(self._available[fingerprint])
+        except KeyError:
+            pass
+        if len(self._available) >= self.max_available:
+            self._available.clear()
+            pass
+        modules = self._available[fingerprint] = tuple(sitecomp for sitecomp in self._enabled if sitecomp.has_perm(user))
+        return list(modules)
+
+    def freeze(self):
+        """Freeze the enabled site modules and preload their menus.
+
+        Called once the apps are loaded. The site modules checking the
+        user permission are the ones overriding `has_perm`.
+        """
+        self._enabled = tuple(self.enabled_modules())
+        self._restricted = tuple(sitecomp for sitecomp in self._enabled
+                                 if type(sitecomp).has_perm is not SiteModuleMixin.has_perm)
+        self._available = {}
+        for sitecomp in self._enabled:
+            sitecomp.preload_menu()
+            pass
+        pass
 
     def get_module(self, label):
         """Get site module by label."""
@@ -83,11 +126,14 @@ class SiteModuleRegistry(object):
 
         Can be called on the package level.
         """
-        tagvalues = "\n".join(["%s: %s" % (attr, str(getattr(module, attr))) for attr in dir(module) if attr in ['create', 'menu', 'name', 'label'] ])
-        # tagvalues = "\n".join(["%s" % (attr) for attr in dir(module) if attr not in ['urls'] ])
-        logger.debug("module {} registered.\ndir : {}".format(module.label, tagvalues ))
+        if logger.isEnabledFor(logging.DEBUG):
+            tagvalues = "\n".join(["%s: %s" % (attr, str(getattr(module, attr))) for attr in dir(module) if attr in ['create', 'menu', 'name', 'label'] ])
+            logger.debug("module %s registered.\ndir : %s", module.label, tagvalues)
+            pass
         self._registry[module.label] = module
         self._modules[module.name] = module
+        self._enabled = None
+        self._available = {}
         pass
 
     @property
@@ -109,6 +155,83 @@ class SiteModuleRegistry(object):
 module_registry = SiteModuleRegistry()
 
 
+class URLTemplate(object):
+    """Named URL compiled into a string template with key slots.
+
+    The template is made by reversing the URL once with probe values
+    and splitting the result at them. Every slot remembers if it takes
+    slug characters or digits only, and a key that does not fit is
+    left to `reverse()`.
+    """
+
+    # Digits fit int, slug, str and path converters.
+    PROBE = '90000000{:03d}'
+    LETTERS = 'cworgslot{:03d}'
+    SLUG = re.compile(r'^[-a-zA-Z0-9_]+$')
+    DIGITS = re.compile(r'^[0-9]+$')
+
+    def __init__(self, parts, slots):  # noqa D102
+        self.parts = parts
+        self.slots = slots
+
+    @classmethod
+    def compile(cls, named_url, n_keys):
+        """Compile the named URL taking `n_keys` args, or return None."""
+        probes = [cls.PROBE.format(i) for i in range(n_keys)]
+        try:
+            url = reverse(named_url, args=probes)
+        except NoReverseMatch:
+            return None
+        prefix = get_script_prefix()
+        if not url.startswith(prefix):
+            return None
+        url = url[len(prefix):]
+
+        parts, slots = [], []
+        for i, probe in enumerate(probes):
+            if url.count(probe) != 1:
+                return None
+            head, url = url.split(probe)
+            parts.append(head)
+            try:
+                reverse(named_url, args=probes[:i] + [cls.LETTERS.format(i)] + probes[i + 1:])
+                slots.append(cls.SLUG)
+            except NoReverseMatch:
+                slots.append(cls.DIGITS)
+                pass
+            pass
+        parts.append(url)
+        return cls(parts, slots)
+
+    def format(self, keys):
+        """Return the URL for the keys, or None if a key does not fit."""
+        if len(keys) != len(self.slots):
+            return None
+        url = [get_script_prefix(), self.parts[0]]
+        for key, slot, part in zip(keys, self.slots, self.parts[1:]):
+            value = str(key)
+            if not slot.match(value):
+                return None
+            url.append(value)
+            url.append(part)
+            pass
+        return ''.join(url)
+
+
+# Compiled URL templates, keyed by (urlconf, named url, number of keys).
+_url_templates = {}
+
+
+def get_url_template(named_url, n_keys):
+    """Return the cached `URLTemplate` of the named URL, or None."""
+    key = (get_urlconf(), named_url, n_keys)
+    try:
+        return _url_templates[key]
+    except KeyError:
+        template = _url_templates[key] = URLTemplate.compile(named_url, n_keys)
+        return template
+
+
 class SiteModuleMixin(object):
     """Extension for the django AppConfig. Makes django app pluggable at runtime.
 
@@ -197,6 +320,17 @@ class SiteModuleMixin(object):
         """Check is user have permission to access to the site module."""
         return True
 
+    def get_perm_fingerprint(self, user):
+        """Hashable value deciding `has_perm` for the user.
+
+        Users with the same fingerprint share the permitted site modules.
+        The default is the user state and permission set, a site module
+        whose `has_perm` depends on anything else overrides it.
+        """
+        if not user.is_authenticated:
+            return None
+        return (user.is_active, user.is_superuser, frozenset(user.get_all_permissions()))
+
     def get_urls(self):  # noqa D102
         if module_has_submodule(self.module, 'urls'):
             urls_module_name = '%s.%s' % (self.name, 'urls')
@@ -238,11 +372,20 @@ class SiteModuleMixin(object):
 
             {% include module.menu %}
         """
+        return self.__dict__.get('_menu') or self.load_menu()
+
+    def load_menu(self):
+        """Load the menu template, or an empty template if there is none."""
         try:
             return get_template('{}/menu.html'.format(self.label))
         except TemplateDoesNotExist:
             return Template('')
 
+    def preload_menu(self):
+        """Load the menu template once, `menu()` returns it from then on."""
+        self._menu = self.load_menu()
+        pass
+
     def base_template(self):
         """Base template for a module.
 
@@ -275,14 +418,32 @@ class SiteModuleMixin(object):
 
     def get_absolute_url(self, model_object, model_name, url_name):
         '''get the absolute URL for the model object.'''
+        return self.get_absolute_urls([model_object], model_name, url_name)[0]
+
+
+    def get_absolute_urls(self, model_objects, model_name, url_name):
+        '''get the absolute URLs for the model objects.
+
+        The named URL is compiled once into a `URLTemplate`, reverse()
+        is only used for the URLs that can not be made from it.
+        '''
         model_path = self.get_model_path(model_name)
-        try: 
-            return reverse(self.get_named_url(model_name, url_name),
-                           args=self.get_model_key(model_object, model_path))
-        except NoReverseMatch as exc:
-            logger.debug('No reverse for url {} with keys {}'.format(self.get_named_url(model_name, url_name), self.get_model_key(model_object, model_path)))
-            raise exc
-        pass
+        named_url = self.get_named_url(model_name, url_name)
+        urls = []
+        for model_object in model_objects:
+            keys = self.get_model_key(model_object, model_path)
+            template = get_url_template(named_url, len(keys))
+            url = template.format(keys) if template is not None else None
+            if url is None:
+                try:
+                    url = reverse(named_url, args=keys)
+                except NoReverseMatch as exc:
+                    logger.debug('No reverse for url {} with keys {}'.format(named_url, keys))
+                    raise exc
+                pass
+            urls.append(url)
+            pass
+        return urls
 
 
     def get_model_key(self, model_object, model_path):
@@ -309,11 +470,13 @@ def context_processor(request):
     if request.resolver_match:
         module = module_registry.get_module(request.resolver_match.app_name)
         if module is None:
-            logger.info('You need to add SiteModuleMixin to AppConfig instance of "{}"'.format(request.resolver_match.app_name))
-            attrs = ", ".join( "{}={}".format(attr, getattr( request.resolver_match, attr, "None")) for attr in [ 'url_name', 'app_name', 'namespace', 'route', 'viewName'])
-            logger.debug("request.resolver_match ==> {}".format(attrs))
+            logger.info('You need to add SiteModuleMixin to AppConfig instance of "%s"', request.resolver_match.app_name)
+            if logger.isEnabledFor(logging.DEBUG):
+                attrs = ", ".join( "{}={}".format(attr, getattr( request.resolver_match, attr, "None")) for attr in [ 'url_name', 'app_name', 'namespace', 'route', 'viewName'])
+                logger.debug("request.resolver_match ==> %s", attrs)
+                pass
             pass
-        logger.debug("module ==> {}".format("None" if module is None else module.name))
+        logger.debug("module ==> %s", "None" if module is None else module.name)
         pass
     else:
         logger.debug("request.resolver_match is None")
@@ -321,7 +484,9 @@ def context_processor(request):
 
     modules = module_registry.available_modules(request.user)
 
-    logger.debug("n-modules {}: {} in {}".format(len(modules), module.name if module is not None else "NONE", ",".join([module.name for module in modules])))
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("n-modules %d: %s in %s", len(modules), module.name if module is not None else "NONE", ",".join([module.name for module in modules]))
+        pass
 
     return {
         'modules': modules,
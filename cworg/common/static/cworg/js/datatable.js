@@ -0,0 +1,63 @@
+/* Copyright (c) 2020 Naoyuki Tai <naoyukitai@gmail.com> */
+/* All rights reserved. */
+
+/*
+ * Keyset pagination for the list views.
+ *
+ * The list view returns the cursor of the next page with the data.
+ * When the next page is requested, the cursor is sent back so the
+ * server can seek to it instead of scanning the OFFSET. The cursor of
+ * the page after the one rendered with the html comes in the config.
+ */
+(function ($) {
+  $(document).on('xhr.dt', function (e, settings, json) {
+    settings.cworgCursor = json && json.cursor ? json.cursor : null;
+  });
+
+  $(document).on('preXhr.dt', function (e, settings, data) {
+    var cursor = settings.cworgCursor === undefined ?
+        settings.oInit.cworgCursor : settings.cworgCursor;
+    // dmc-datatable has already prefixed the request parameters
+    if (cursor && cursor.key && cursor.start === data['datatable-start']) {
+      data['datatable-cursor'] = cursor.key;
+    }
+  });
+
+  /*
+   * Conditional requests for the list data.
+   *
+   * The draw counter changes with every request, so the browser cache
+   * never revalidates the data. The responses are kept by their other
+   * parameters, and sent back with the ETag. On 304 Not Modified the
+   * kept response is used with the new draw counter.
+   */
+  var responses = {};
+  var MAX_RESPONSES = 50;
+
+  $.ajaxPrefilter(function (options, originalOptions, jqXHR) {
+    var data = originalOptions.data;
+    if (!$.isPlainObject(data) || data['datatable-draw'] === undefined) {
+      return;
+    }
+    var params = $.extend({}, data);
+    delete params['datatable-draw'];
+    var key = originalOptions.url + '?' + $.param(params);
+    var kept = responses[key];
+    if (kept) {
+      options.headers = $.extend({}, options.headers, {'If-None-Match': kept.etag});
+    }
+
+    var success = options.success;
+    options.success = function (json, status, xhr) {
+      if (xhr.status === 304 && kept) {
+        json = $.extend({}, kept.json, {draw: data['datatable-draw'] * 1});
+      } else if (json && xhr.getResponseHeader('ETag')) {
+        if (Object.keys(responses).length >= MAX_RESPONSES) {
+          responses = {};
+        }
+        responses[key] = {etag: xhr.getResponseHeader('ETag'), json: json};
+      }
+      return success.call(this, json, status, xhr);
+    };
+  });
+})(jQuery);
@@ -1,3 +1,204 @@
-from django.test import TestCase
+import datetime
+import json
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import connection, IntegrityError
+from django.test import Client, RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from locations.models import Location
+from meets.models import Meet
+from meets.views import MeetListView
+from teams.models import Team, TeamMember
+from .models import allocate_slug, allocate_slugs, allocate_distinct_slugs
 
 # Create your tests here.
+
+class AllocateSlugsTests(TestCase):
+    def test_free_base(self):
+        self.assertEqual(allocate_slugs(Location, 'court'), ['court'])
+        pass
+
+    def test_suffixes(self):
+        Location.objects.create(name='Court')
+        self.assertEqual(allocate_slugs(Location, 'court', count=2), ['court-2', 'court-3'])
+        Location.objects.create(name='Court')
+        self.assertEqual(allocate_slug(Location, 'court'), 'court-3')
+        pass
+
+    def test_prefix_is_not_taken(self):
+        Location.objects.create(name='Court house')
+        self.assertEqual(allocate_slug(Location, 'court'), 'court')
+        pass
+
+    def test_reserved_and_rest_keywords(self):
+        self.assertEqual(allocate_slug(Location, 'update'), 'update-2')
+        self.assertEqual(allocate_slug(Location, 'locations', reserved=Location.slug_reserved), 'locations-2')
+        self.assertEqual(Location.objects.create(name='Location').slug, 'location-2')
+        pass
+
+    def test_exclude(self):
+        self.assertEqual(allocate_slugs(Location, 'court', exclude=['court']), ['court-2'])
+        pass
+
+    def test_truncate(self):
+        max_length = Location._meta.get_field('slug').max_length
+        base = 'x' * (max_length + 10)
+        slug = Location.objects.create(name=base).slug
+        self.assertEqual(slug, 'x' * max_length)
+        self.assertEqual(allocate_slug(Location, base), 'x' * (max_length - 2) + '-2')
+        pass
+
+    def test_empty_base(self):
+        self.assertEqual(allocate_slug(Location, ''), 'location')
+        pass
+
+    def test_distinct_slugs(self):
+        Location.objects.create(name='Court')
+        slugs = allocate_distinct_slugs(Location, ['court', 'court', 'court-park', 'court'])
+        self.assertEqual(slugs, ['court-2', 'court-3', 'court-park', 'court-4'])
+        self.assertEqual(allocate_distinct_slugs(Location, []), [])
+        pass
+
+    pass
+
+
+class SlugModelMixinTests(TestCase):
+    def test_keeps_slug(self):
+        location = Location.objects.create(name='Court', slug='center-court')
+        self.assertEqual(location.slug, 'center-court')
+        pass
+
+    def test_retry_taken_slug(self):
+        Location.objects.create(name='Court')
+        # a concurrent insert took the slug after it was allocated
+        with mock.patch.object(Location, 'allocate_slug', side_effect=['court', 'court-2']) as allocate:
+            location = Location.objects.create(name='Court')
+        self.assertEqual(location.slug, 'court-2')
+        self.assertEqual(allocate.call_count, 2)
+        pass
+
+    def test_retries_are_limited(self):
+        Location.objects.create(name='Court')
+        with mock.patch.object(Location, 'allocate_slug', return_value='court'):
+            with self.assertRaises(IntegrityError):
+                Location.objects.create(name='Court')
+        self.assertEqual(Location.objects.count(), 1)
+        pass
+
+    pass
+
+
+class KeysetPaginationTests(TestCase):
+    """Keyset pages of the meet list, which enables `keyset_pagination`."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='pw')
+        team = Team.objects.create(name='Wednesday', owner=self.user, join_password='x')
+        TeamMember.objects.create(team=team, member=self.user)
+        starttime = timezone.make_aware(datetime.datetime(2026, 1, 7, 19, 0))
+        for n in range(25):
+            # repeated names, the pk breaks the ties
+            Meet.objects.create(name='Meet %d' % (n % 4), team=team, manager=self.user, min_attendees=0,
+                                starttime=starttime + datetime.timedelta(days=7 * n),
+                                duration=datetime.timedelta(minutes=90))
+            pass
+        self.client = Client()
+        self.client.login(username='alice', password='pw')
+        pass
+
+    def get_page(self, start, order=None, cursor=None):
+        params = {'datatable-draw': 1, 'datatable-start': start, 'datatable-length': 10}
+        if order is not None:
+            params.update({'datatable-order[0][column]': order[0], 'datatable-order[0][dir]': order[1]})
+            pass
+        if cursor is not None:
+            params['datatable-cursor'] = cursor
+            pass
+        response = self.client.get('/meets/', params, HTTP_DATATABLE='1')
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content.decode())
+
+    def assert_keyset_pages(self, order):
+        page = self.get_page(0, order)
+        rows = list(page['rows'])
+        while 'cursor' in page:
+            start, cursor = page['cursor']['start'], page['cursor']['key']
+            with CaptureQueriesContext(connection) as queries:
+                page = self.get_page(start, order, cursor)
+            # the page is looked up by the key, without OFFSET
+            self.assertFalse([query for query in queries.captured_queries
+                              if 'meets_meet' in query['sql'] and 'OFFSET' in query['sql']])
+            self.assertEqual(page['rows'], self.get_page(start, order)['rows'])
+            rows.extend(page['rows'])
+            pass
+        self.assertEqual(len(rows), 25)
+        self.assertEqual(len(set(json.dumps(row) for row in rows)), 25)
+        pass
+
+    def test_default_order(self):
+        self.assert_keyset_pages(None)
+        pass
+
+    def test_name_order(self):
+        self.assert_keyset_pages((0, 'asc'))
+        self.assert_keyset_pages((0, 'desc'))
+        pass
+
+    def test_tampered_cursor(self):
+        cursor = self.get_page(0)['cursor']['key']
+        offset_rows = self.get_page(10)['rows']
+        for bad in (cursor[:-2] + 'xx', 'garbage'):
+            self.assertEqual(self.get_page(10, cursor=bad)['rows'], offset_rows)
+            pass
+        pass
+
+    def test_cursor_of_another_start(self):
+        cursor = self.get_page(0)['cursor']['key']
+        self.assertEqual(self.get_page(20, cursor=cursor)['rows'], self.get_page(20)['rows'])
+        pass
+
+    def test_cursor_of_another_order(self):
+        cursor = self.get_page(0, (0, 'asc'))['cursor']['key']
+        self.assertEqual(self.get_page(10, (0, 'desc'), cursor)['rows'], self.get_page(10, (0, 'desc'))['rows'])
+        pass
+
+    pass
+
+
+class PerUserMeetListView(MeetListView):
+    def get_list_display(self):
+        if self.request.user.is_staff:
+            return ["name", "team", "starttime"]
+        return ["name", "starttime"]
+
+    pass
+
+
+class ColumnsCacheTests(TestCase):
+    def get_view(self, user):
+        request = RequestFactory().get('/meets/')
+        request.user = user
+        view = PerUserMeetListView()
+        view.setup(request)
+        view.object_list = Meet.objects.all()
+        return view
+
+    def test_columns_per_user(self):
+        staff = User(username='staff', is_staff=True)
+        player = User(username='player')
+        for user, columns, select_related in ((staff, ['name', 'team', 'starttime'], True),
+                                              (player, ['name', 'starttime'], False),
+                                              (staff, ['name', 'team', 'starttime'], True)):
+            view = self.get_view(user)
+            config = view.get_static_datatable_config()
+            self.assertEqual([column['name'] for column in config['columns']], columns)
+            self.assertIn('/meets/', view.get_datatable_config_json())
+            plan = view.get_queryset_plan(Meet)
+            self.assertEqual('team' in plan.select_related, select_related)
+            pass
+        pass
+
+    pass
@@ -2,8 +2,12 @@
 # All rights reserved.
 from __future__ import unicode_literals
 
+import csv
 import datetime
 import decimal
+import hashlib
+import itertools
+import json
 import six
 
 from collections import OrderedDict
@@ -11,21 +15,33 @@ from copy import deepcopy
 
 from django.contrib.auth import get_permission_codename
 from django.contrib.auth.decorators import login_required
-from django.core.exceptions import FieldDoesNotExist
-from django.core.exceptions import ImproperlyConfigured, PermissionDenied
+from django.core import signing
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet, FieldDoesNotExist
+from django.core.exceptions import ImproperlyConfigured, PermissionDenied, ValidationError
+from django.db import models
+from django.db.models import Q
 from django.db.models.query import QuerySet
 from django.forms.forms import pretty_name
-from django.http import JsonResponse
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.urls import reverse, NoReverseMatch
 from django.utils import formats, timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
 from django.utils.decorators import method_decorator
 from django.utils.encoding import force_text
-from django.utils.html import conditional_escape, format_html
+from django.utils.html import conditional_escape, escape, format_html
+from django.utils.safestring import mark_safe
+from django.utils.translation import get_language
 from django.views.generic import View
 from django.views.generic.base import ContextMixin, TemplateResponseMixin
 
 from .. import forms
+from .mixins import URLObjectMixin
 
+from common.cache import (cached_count, estimate_count, get_query_tables, get_row_versions, get_table_versions,
+                          is_cache_shared)
 from common.sitemodule import module_registry, SITE_TEMPLATE_PACKS
 
 from cwlog import logger
@@ -46,6 +62,27 @@ def _get_attr_label(owner, attr_name):
         return attr_name
 
 
+def batched(func):
+    """Mark a data source callable as batched.
+
+    A batched callable is called once per page with the list of the
+    page objects, and returns a dict of the column values keyed by the
+    object pk.
+
+    Example::
+
+        @batched
+        def joined(self, teams):
+            joined = set(TeamMember.objects.filter(
+                team__in=teams, member=self.request.user
+            ).values_list('team_id', flat=True))
+            return {team.pk: team.pk in joined for team in teams}
+
+    """
+    func.batched = True
+    return func
+
+
 class ModelField(object):
     """Retrieve a field value from the model.
 
@@ -72,6 +109,9 @@ class ModelField(object):
             return self.choices.get(attr, attr)
         return str(attr)
 
+    def get_choice_display(self, value):  # noqa D102
+        return force_text(self.choices.get(value, value))
+
     @property
     def label(self):  # noqa D102
         try:
@@ -133,6 +173,14 @@ class DataSourceAttr(object):
             return attr(obj)
         return attr
 
+    @property
+    def batched(self):  # noqa D102
+        return getattr(getattr(self.data_source, self.name), 'batched', False)
+
+    def get_values(self, objs):
+        """Return the values for the objects, keyed by pk, from a batched callable."""
+        return getattr(self.data_source, self.name)(objs)
+
     @property
     def label(self):
         """Retrieve the label for the data source attribute.
@@ -155,6 +203,161 @@ class DataSourceAttr(object):
         return False
 
 
+class DataTableColumn(object):
+    """Compiled column of the data table.
+
+    Keeps the data attribute, the value accessor, the value formatter
+    and the link flag of a `list_display` column, so the row rendering
+    does not need to resolve them again for every cell.
+
+    Values of a batched column are loaded for the whole page by
+    `prepare()` before the rows are rendered.
+    """
+
+    def __init__(self, name, attr, linked=False, formatter=force_text):  # noqa D102
+        self.name = name
+        self.attr = attr
+        self.linked = linked
+        self.formatter = formatter
+        self.batched = getattr(attr, 'batched', False)
+        self._values = {}
+        if self.batched:
+            self.accessor = self._get_batched_value
+        else:
+            self.accessor = attr.get_value
+
+    def prepare(self, objs):
+        """Load the batched column values of the objects."""
+        if self.batched:
+            self._values = self.attr.get_values(objs)
+            pass
+        pass
+
+    def _get_batched_value(self, obj):
+        return self._values.get(obj.pk)
+
+    def get_value(self, obj):  # noqa D102
+        return self.accessor(obj)
+
+    def get_export_value(self, obj):
+        """Return the raw value, or the display of a field choice."""
+        value = self.accessor(obj)
+        choices = getattr(self.attr, 'choices', None)
+        if choices:
+            return choices.get(value, value)
+        return value
+
+
+class _KeyRecorder(object):
+    """Stand-in model object recording the attributes read from it.
+
+    Used to find out which fields a `model_key_map` function touches.
+    """
+
+    def __init__(self, paths, path=()):  # noqa D102
+        self._paths = paths
+        self._path = path
+
+    def __getattr__(self, name):  # noqa D102
+        path = self._path + (name,)
+        self._paths.append(path)
+        return _KeyRecorder(self._paths, path)
+
+
+class QuerySetPlan(object):
+    """Related lookups and loaded columns for the list queryset.
+
+    :keyword select_related: Forward relations joined into the query
+
+    :keyword prefetch_related: Multi-valued relations prefetched per page
+
+    :keyword only: Columns of the listed model to load, or None to load
+                   all of them.
+    """
+
+    def __init__(self, select_related=(), prefetch_related=(), only=None):  # noqa D102
+        self.select_related = tuple(select_related)
+        self.prefetch_related = tuple(prefetch_related)
+        self.only = tuple(only) if only is not None else None
+
+    def apply(self, queryset):
+        """Return the queryset with the plan applied."""
+        if queryset._fields is not None:
+            # values() querysets do not have model instances to plan for
+            return queryset
+        if self.select_related:
+            queryset = queryset.select_related(*self.select_related)
+        if self.prefetch_related:
+            queryset = queryset.prefetch_related(*self.prefetch_related)
+        if self.only is not None and queryset.query.deferred_loading == (frozenset(), True):
+            queryset = queryset.only(*self.only)
+        return queryset
+
+
+def _get_index_ordering(field):
+    """Return the ordering expression of an indexed model field, or None.
+
+    A field is indexed when it leads an index of its table. Foreign
+    keys are ordered by the column, to not join the related table.
+    """
+    if not field.concrete or field.many_to_many:
+        return None
+    if field.primary_key or field.unique or field.db_index:
+        return field.attname
+    opts = field.model._meta
+    leading = [index.fields[0].lstrip('-') for index in opts.indexes if index.fields]
+    leading.extend(fields[0] for fields in opts.index_together + opts.unique_together if fields)
+    leading.extend(constraint.fields[0] for constraint in opts.constraints
+                   if getattr(constraint, 'fields', None))
+    if field.name in leading:
+        return field.attname
+    return None
+
+
+def _get_model_key_paths(model):
+    """Return the field paths read by the module `model_key_map` for model."""
+    opts = model._meta
+    module = module_registry.get_module(opts.app_label)
+    if module is None or not module.model_key_map:
+        return []
+    model_key = module.model_key_map.get(module.get_model_path(opts.model_name))
+    if not callable(model_key):
+        return []
+    paths = []
+    try:
+        model_key(_KeyRecorder(paths))
+    except Exception:
+        logger.debug("model_key_map of {} can not be inspected.".format(opts.label))
+        return []
+    return paths
+
+
+class _EchoBuffer(object):
+    """File-like object returning the written value, for `csv.writer`."""
+
+    def write(self, value):  # noqa D102
+        return value
+
+
+# Resolved data attributes, keyed by (view class, model, attr name).
+#
+# Model fields and model attributes are shared across the requests as
+# is. Data source attributes are bound to the view instance, so only
+# the data source position is kept and the attribute is created for
+# each view.
+_data_attr_cache = {}
+
+# Queryset plans, keyed by (view class, model, columns key).
+_queryset_plan_cache = {}
+
+# Static datatable configs, keyed by (view class, columns key). Holds
+# the config and its escaped JSON split at the ajax url.
+_datatable_config_cache = {}
+_DATATABLE_URL_MARKER = '__cworg_datatable_url__'
+
+ROW_KEY = 'cworg:row:{}'
+
+
 class DataTableMixin(ContextMixin):
     """Mixing for list views with DataTable."""
 
@@ -164,6 +367,7 @@ class DataTableMixin(ContextMixin):
         'serverSide': True,
         'ajax': {
             'url': '.',
+            'dataSrc': 'rows',
         },
         'order': [],
         'ordering': True,
@@ -185,23 +389,46 @@ class DataTableMixin(ContextMixin):
         }
     }
     list_display = ('__str__', )
+    list_select_related = True
+    search_fields = ()
     empty_value_display = ""
     ordering = None
     viewset = None
     paginate_by = 15
+    keyset_pagination = False
+    count_estimate_threshold = None
+    export_formats = ('csv', 'ndjson')
+    export_chunk_size = 2000
+    stream_threshold = 100
+    stream_chunk_size = 100
+    use_values_list = True
+    row_cache = False
+    row_cache_models = ()
+    row_cache_timeout = 3600
+    sortable_columns = None
+    _table_columns = None
+    _sortable = None
+    _keyset_ordering = False
+    _row_fields = False
 
     def get_context_data(self, **kwargs):
         """Update view context.
 
         Include `datatable_config`, 'headers' and initial `data` to
-        first page render.
+        first page render. The datatable is told not to request the
+        first page again.
         """
         kwargs.setdefault('form_template_pack', SITE_TEMPLATE_PACKS)
         context = super(DataTableMixin, self).get_context_data(**kwargs)
+        data = list(self.get_table_data(0, self.paginate_by))
+        deferred = self.get_deferred_loading(data)
+        config = self.get_datatable_config()
+        config.update(deferred)
         context.update({
-            'datatable_config': self.get_datatable_config(),
+            'datatable_config': config,
+            'datatable_config_json': self.get_datatable_config_json(deferred),
             'headers': self.get_headers_data(),
-            'data': self.get_table_data(0, self.paginate_by),
+            'data': data,
         })
 
         return context
@@ -210,12 +437,88 @@ class DataTableMixin(ContextMixin):
         """Return list of columns to display."""
         return self.list_display
 
+    def get_columns_key(self):
+        """Return the displayed and the linked columns, as a cache key.
+
+        The cached datatable configs and queryset plans are keyed by it,
+        so a view resolving `list_display` per request or per user gets
+        them for its columns.
+        """
+        list_display = tuple(self.get_list_display())
+        return list_display, tuple(self.get_list_display_links(list_display) or ())
+
     def get_datatable_config(self):
-        """Prepare datatable config."""
+        """Prepare datatable config.
+
+        The static config is shared by the view class, the copy only
+        differs in the ajax url.
+        """
+        config = dict(self.get_static_datatable_config())
+        config['ajax'] = dict(config['ajax'], url=self.request.path)
+        return config
+
+    def get_datatable_config_json(self, extra=None):
+        """Datatable config as JSON, escaped for a html attribute.
+
+        `extra` options are added to the config.
+        """
+        if type(self).get_datatable_config is not DataTableMixin.get_datatable_config:
+            config = self.get_datatable_config()
+            config.update(extra or {})
+            return escape(json.dumps(config, cls=DjangoJSONEncoder))
+        _, head, tail = self._get_static_datatable_entry()
+        if extra:
+            # the tail ends with the closing brace of the config
+            tail = tail[:-1] + ', ' + escape(json.dumps(extra, cls=DjangoJSONEncoder)[1:-1]) + '}'
+            pass
+        return mark_safe(head + escape(json.dumps(self.request.path)) + tail)
+
+    def get_deferred_loading(self, data):
+        """Return the config options for the first page rendered with the html.
+
+        `deferLoading` carries the record counts, so the datatable
+        does not request the page again. With the keyset pagination,
+        `cworgCursor` is the cursor of the second page.
+        """
+        if not data:
+            return {}
+        config = {'deferLoading': [self.total_filtered(), self.total()]}
+        if self.keyset_pagination and len(data) == self.paginate_by:
+            key = self.encode_cursor(len(data), data[-1][0])
+            if key is not None:
+                config['cworgCursor'] = {'start': len(data), 'key': key}
+                pass
+            pass
+        return config
+
+    def get_static_datatable_config(self):
+        """Return the request independent part of the datatable config.
+
+        Built once per view class and columns, do not modify the result.
+        """
+        return self._get_static_datatable_entry()[0]
+
+    def _get_static_datatable_entry(self):
+        key = (self.__class__, self.get_columns_key())
+        try:
+            return _datatable_config_cache[key]
+        except KeyError:
+            pass
+        config = self.build_datatable_config()
+        marker = escape(json.dumps(_DATATABLE_URL_MARKER))
+        config_json = escape(json.dumps(
+            dict(config, ajax=dict(config['ajax'], url=_DATATABLE_URL_MARKER)),
+            cls=DjangoJSONEncoder))
+        head, tail = config_json.split(marker)
+        _datatable_config_cache[key] = (config, head, tail)
+        return _datatable_config_cache[key]
+
+    def build_datatable_config(self):
+        """Build the static datatable config."""
         config = deepcopy(self.datatable_default_config)
         config['pageLength'] = self.paginate_by
-        config['ajax']['url'] = self.request.path
         config['columns'] = self.get_columns_def()
+        config['bFilter'] = bool(self.search_fields)
 
         if self.ordering:
             datatable_ordering = []
@@ -230,47 +533,167 @@ class DataTableMixin(ContextMixin):
             config.update(self.datatable_config)
         return config
 
+    def get_data_sources(self):
+        """Return objects searched for the data source attributes."""
+        return [self, self.viewset] if self.viewset is not None else [self]
+
     def get_data_attr(self, attr_name):
         """Data getter for an attribute.
 
         Data could comes from the model field or external `data_source`
         method call.
+
+        The lookup result is cached per view class and model.
         """
-        opts = self.object_list.model._meta
+        model = self.object_list.model
+        key = (self.__class__, model, attr_name)
+        attr = _data_attr_cache.get(key)
+        if attr is None:
+            attr = self._lookup_data_attr(model, attr_name)
+            _data_attr_cache[key] = attr
+            pass
+        if isinstance(attr, int):
+            return DataSourceAttr(self.get_data_sources()[attr], attr_name)
+        return attr
+
+    def _lookup_data_attr(self, model, attr_name):
+        opts = model._meta
         try:
             return ModelField(opts.get_field(attr_name))
         except FieldDoesNotExist:
             if attr_name == "__str__":
-                return ModelAttr(self.object_list.model, attr_name, opts.verbose_name)
+                return ModelAttr(model, attr_name, opts.verbose_name)
             else:
-                data_sources = [self, self.viewset] if self.viewset is not None else [self]
-                for data_source in data_sources:
+                for position, data_source in enumerate(self.get_data_sources()):
                     if hasattr(data_source, attr_name):
-                        return DataSourceAttr(data_source, attr_name)
-            if hasattr(self.object_list.model, attr_name):
-                return ModelAttr(self.object_list.model, attr_name)
+                        return position
+            if hasattr(model, attr_name):
+                return ModelAttr(model, attr_name)
         raise AttributeError("Unable to lookup '{}' on {}" .format(
-            attr_name, self.object_list.model._meta.object_name)
+            attr_name, opts.object_name)
         )
 
+    def get_list_display_links(self, list_display):
+        """Return columns list that would be linked to the object details."""
+        return ()
+
+    def get_table_columns(self):
+        """Return the compiled `list_display` columns.
+
+        The columns are compiled once per view instance and reused for
+        every row.
+        """
+        if self._table_columns is None:
+            list_display = self.get_list_display()
+            links = self.get_list_display_links(list_display) or ()
+            self._table_columns = OrderedDict()
+            for field_name in list_display:
+                column = DataTableColumn(field_name,
+                                         self.get_data_attr(field_name),
+                                         linked=field_name in links)
+                column.formatter = self.get_value_formatter(column)
+                self._table_columns[field_name] = column
+                pass
+            pass
+        return self._table_columns
+
+    def get_sortable_columns(self):
+        """Return the sortable columns, mapped to their ordering expressions.
+
+        Without `sortable_columns` declared, the model field columns
+        leading an index of the table are sortable, so the sorts do
+        not fall back to a filesort.
+        """
+        if self._sortable is None:
+            if self.sortable_columns is not None:
+                sortable = dict(self.sortable_columns)
+            else:
+                model = self._get_list_model()
+                sortable = {}
+                for field_name in self.get_list_display():
+                    try:
+                        field = model._meta.get_field(field_name)
+                    except FieldDoesNotExist:
+                        continue
+                    ordering = _get_index_ordering(field)
+                    if ordering is not None:
+                        sortable[field_name] = ordering
+                        pass
+                    pass
+                pass
+            self._sortable = sortable
+            pass
+        return self._sortable
+
     def get_columns_def(self):
-        """Return columns definition for the datables js config."""
+        """Return columns definition for the datables js config.
+
+        Rows are sent as arrays, so the columns read their data by
+        position.
+        """
+        sortable = self.get_sortable_columns()
         return [
-            {'data': field_name, 'orderable': self.get_data_attr(field_name).orderable}
-            for field_name in self.get_list_display()
+            {'data': position, 'name': column.name,
+             'orderable': column.attr.orderable and column.name in sortable}
+            for position, column in enumerate(self.get_table_columns().values())
         ]
 
     def get_headers_data(self):
         """Readable column titles."""
-        for field_name in self.get_list_display():
-            attr = self.get_data_attr(field_name)
-            yield field_name, attr.label
+        for column in self.get_table_columns().values():
+            yield column.name, column.attr.label
+
+    def get_value_formatter(self, column):
+        """Pick the function formatting the values of a column.
+
+        The formatter of a model field column is chosen by the field
+        class, and shows None as `empty_value_display`. Other columns
+        could hold any value, they are formatted by `format_value`.
+        """
+        attr = column.attr
+        if not isinstance(attr, ModelField):
+            return self.format_value
+        field = attr.field
+        if attr.choices:
+            format_field = attr.get_choice_display
+        elif isinstance(field, (models.BooleanField, models.NullBooleanField)):
+            format_field = self.format_boolean
+        elif isinstance(field, models.DateTimeField):
+            format_field = self.format_datetime
+        elif isinstance(field, (models.DateField, models.TimeField)):
+            format_field = formats.localize
+        elif isinstance(field, (models.IntegerField, models.DecimalField, models.FloatField)):
+            format_field = formats.number_format
+        else:
+            format_field = force_text
+        empty_value_display = self.empty_value_display
+
+        def format_field_value(value):
+            if value is None:
+                return empty_value_display
+            return format_field(value)
+        return format_field_value
 
     def format_column(self, item, field_name, value):
+        """Format a cell value with the column formatter."""
+        return self.get_table_columns()[field_name].formatter(value)
+
+    def format_boolean(self, value):
+        """Format a boolean value."""
+        return force_text(value)
+
+    def format_datetime(self, value):
+        """Format a datetime in the current time zone."""
+        return formats.localize(timezone.template_localtime(value))
+
+    def format_value(self, value):
+        """Format a value of any type."""
         if value is None:
             return self.empty_value_display
+        elif isinstance(value, bool):
+            return self.format_boolean(value)
         elif isinstance(value, datetime.datetime):
-            return formats.localize(timezone.template_localtime(value))
+            return self.format_datetime(value)
         elif isinstance(value, (datetime.date, datetime.time)):
             return formats.localize(value)
         elif isinstance(value, six.integer_types + (decimal.Decimal, float)):
@@ -280,43 +703,345 @@ class DataTableMixin(ContextMixin):
         else:
             return force_text(value)
 
-    def get_table_data(self, start, length):
-        """Get a page for datatable."""
-        for item in self.object_list[start:start + length]:
-            columns = OrderedDict()
-            for n, field_name in enumerate(self.get_list_display()):
-                attr = self.get_data_attr(field_name)
-                value = self.format_column(item, field_name, attr.get_formatted_string(item))
-                columns[field_name] = value
-            yield item, columns
+    def get_keyset_ordering(self):
+        """Return the keyset pagination ordering.
+
+        The ordering is a list of `(field, descending)` pairs, ending
+        with an unique field. None is returned when the list ordering
+        can not be used for the keyset pagination, ex. it contains
+        nullable or related fields.
+        """
+        if self._keyset_ordering is False:
+            self._keyset_ordering = self._lookup_keyset_ordering()
+            pass
+        return self._keyset_ordering
+
+    def _lookup_keyset_ordering(self):
+        query = self.object_list.query
+        opts = self.object_list.model._meta
+        keys = []
+        for spec in (query.order_by or opts.ordering):
+            if not isinstance(spec, six.string_types):
+                return None
+            name = spec.lstrip('-')
+            try:
+                field = opts.pk if name == 'pk' else opts.get_field(name)
+            except FieldDoesNotExist:
+                return None
+            if not field.concrete or field.is_relation or field.null:
+                return None
+            keys.append((field, spec.startswith('-')))
+            if field.unique:
+                return keys
+            pass
+        keys.append((opts.pk, False))
+        return keys
+
+    def encode_cursor(self, start, item):
+        """Encode the ordering key of `item` as the cursor of the page at `start`."""
+        keys = self.get_keyset_ordering()
+        if keys is None:
+            return None
+        return signing.dumps({
+            'start': start,
+            'search': self.get_search_term(),
+            'order': [('-' if descending else '') + field.name for field, descending in keys],
+            'key': [field.value_to_string(item) for field, descending in keys],
+        }, salt='datatable-cursor')
+
+    def decode_cursor(self, cursor, start):
+        """Return the ordering key values from the cursor.
+
+        None is returned if the cursor is not for the page at `start`,
+        the current ordering or search.
+        """
+        keys = self.get_keyset_ordering()
+        if not cursor or keys is None:
+            return None
+        try:
+            data = signing.loads(cursor, salt='datatable-cursor')
+            order = [('-' if descending else '') + field.name for field, descending in keys]
+            if data['start'] != start or data['order'] != order or data['search'] != self.get_search_term():
+                return None
+            return [field.to_python(value) for (field, descending), value in zip(keys, data['key'])]
+        except (signing.BadSignature, KeyError, TypeError, ValidationError):
+            return None
+
+    def get_row_fields(self):
+        """Return the fields to fetch the rows with, or None.
+
+        When every column is a plain (non relational) model field, the
+        rows do not need model instances and are fetched with
+        `values_list(named=True)`. The named tuples carry the columns,
+        the primary key as `pk` and the fields used by the item links,
+        so the formatters and URL builders can read them as attributes.
+        """
+        if self._row_fields is False:
+            self._row_fields = self._lookup_row_fields()
+            pass
+        return self._row_fields
+
+    def _lookup_row_fields(self):
+        if not self.use_values_list:
+            return None
+        plan = self.get_queryset_plan(self.object_list.model)
+        if plan.only is None or plan.select_related or plan.prefetch_related:
+            return None
+        for column in self.get_table_columns().values():
+            if type(column.attr) is not ModelField:
+                return None
+            if column.attr.field.is_relation or not column.attr.field.concrete:
+                return None
+            pass
+        fields = ['pk'] + list(plan.only)
+        if self.keyset_pagination and self.get_keyset_ordering() is not None:
+            fields.extend(field.name for field, descending in self.get_keyset_ordering()
+                          if field.name not in fields)
+            pass
+        return fields
+
+    def get_rows(self, queryset):
+        """Return the queryset of the table rows.
+
+        Rows are model instances, or named tuples if `get_row_fields`
+        allows it.
+        """
+        fields = self.get_row_fields()
+        if fields is None:
+            return queryset
+        return queryset.values_list(*fields, named=True)
+
+    def get_page(self, start, length, cursor=None, rows=None):
+        """Return the rows of a datatable page.
+
+        With `keyset_pagination` enabled, a page requested with the
+        cursor of the previous page is looked up by the ordering key,
+        `WHERE (key) > (last key)`, instead of the OFFSET scan.
+
+        `rows` is the queryset to page, `get_rows()` by default.
+        """
+        queryset = self.get_rows(self.object_list) if rows is None else rows
+        if self.keyset_pagination and self.get_keyset_ordering() is not None:
+            keys = self.get_keyset_ordering()
+            queryset = queryset.order_by(
+                *[('-' if descending else '') + field.name for field, descending in keys])
+            values = self.decode_cursor(cursor, start)
+            if values is not None:
+                condition, equal = Q(), Q()
+                for (field, descending), value in zip(keys, values):
+                    lookup = '{}__{}'.format(field.name, 'lt' if descending else 'gt')
+                    condition |= equal & Q(**{lookup: value})
+                    equal &= Q(**{field.name: value})
+                    pass
+                return queryset.filter(condition)[:length]
+            pass
+        return queryset[start:start + length]
+
+    def prepare_items(self, items):
+        """Load what the rows of the items need before they are rendered.
+
+        Prepares the batched columns. Override to load more data for a
+        chunk of rows at once.
+        """
+        for column in self.get_table_columns().values():
+            column.prepare(items)
+            pass
+        pass
+
+    def get_table_data(self, start, length, cursor=None):
+        """Get a page for datatable.
+
+        Yields the item and the tuple of its formatted column values,
+        in the `get_table_columns()` order.
+        """
+        table_columns = list(self.get_table_columns().values())
+        page = self.get_page(start, length, cursor)
+        if isinstance(page, QuerySet) and not page._prefetch_related_lookups:
+            # iterator() would skip the prefetches
+            page = page.iterator(chunk_size=self.stream_chunk_size)
+        page = iter(page)
+        format_column = self.format_column
+        while True:
+            chunk = list(itertools.islice(page, self.stream_chunk_size))
+            if not chunk:
+                break
+            self.prepare_items(chunk)
+            for item in chunk:
+                yield item, tuple([format_column(item, column.name, column.get_value(item))
+                                   for column in table_columns])
+
+    def get_row_cache_role(self):
+        """Return the part of the request user the rendered rows depend on."""
+        user = self.request.user
+        if user.is_superuser:
+            return 'superuser'
+        elif user.is_staff:
+            return 'staff'
+        elif user.is_authenticated:
+            return 'user'
+        return 'anonymous'
+
+    def get_row_cache_tables(self):
+        """Return the tables, besides the listed model, the rows are rendered from.
+
+        These are the tables of the list query, of the related model
+        columns and of `row_cache_models`.
+        """
+        queryset = self.get_rows(self.object_list)
+        try:
+            sql = queryset.query.sql_with_params()[0]
+        except EmptyResultSet:
+            sql = ''
+        tables = set(get_query_tables(queryset, sql))
+        for column in self.get_table_columns().values():
+            if isinstance(column.attr, ModelField) and column.attr.field.is_relation:
+                tables.add(column.attr.field.related_model._meta.db_table)
+                pass
+            pass
+        tables.update(model._meta.db_table for model in self.row_cache_models)
+        tables.discard(self.object_list.model._meta.db_table)
+        return sorted(tables)
+
+    def get_row_cache_context(self):
+        """Return the request dependent part of the row cache keys."""
+        return (
+            self.__class__.__module__, self.__class__.__name__,
+            self.get_row_cache_role(), get_language(),
+            timezone.get_current_timezone_name(),
+            sorted(get_table_versions(self.get_row_cache_tables()).items()),
+        )
+
+    def get_cached_table_data(self, start, length, cursor=None):
+        """Get a page for datatable, with the row tuples rendered and escaped.
+
+        Rendered rows are cached by the model, pk, row version, user
+        role and locale. The page keys are queried first, and only the
+        rows missing from the cache are loaded and rendered.
+        """
+        model = self.object_list.model
+        fields = ['pk']
+        if self.keyset_pagination and self.get_keyset_ordering() is not None:
+            fields.extend(field.name for field, descending in self.get_keyset_ordering())
+            pass
+        page = list(self.get_page(start, length, cursor,
+                                  rows=self.object_list.values_list(*fields, named=True)))
+        if not page:
+            return
+
+        versions = get_row_versions(model, [row.pk for row in page])
+        context = self.get_row_cache_context()
+        keys = {}
+        for row in page:
+            digest = hashlib.md5(repr((context, model._meta.label, row.pk, versions[row.pk])).encode('utf-8'))
+            keys[row.pk] = ROW_KEY.format(digest.hexdigest())
+            pass
+        rendered = cache.get_many(list(keys.values()))
+
+        missing = [pk for pk, key in keys.items() if key not in rendered]
+        if missing:
+            table_columns = list(self.get_table_columns().values())
+            items = list(self.get_rows(self.object_list.filter(pk__in=missing)))
+            self.prepare_items(items)
+            fresh = {}
+            for item in items:
+                if keys[item.pk] in fresh:
+                    continue
+                fresh[keys[item.pk]] = tuple([
+                    conditional_escape(self.format_column(item, column.name, column.get_value(item)))
+                    for column in table_columns])
+                pass
+            cache.set_many(fresh, self.row_cache_timeout)
+            rendered.update(fresh)
+            pass
+
+        for row in page:
+            if keys[row.pk] in rendered:
+                yield row, rendered[keys[row.pk]]
+            pass
+
+    def count_records(self, queryset):
+        """Count the queryset rows.
+
+        The count is cached until a table used by the query changes.
+        With `count_estimate_threshold` set, an unfiltered queryset on a
+        table estimated to have more rows than the threshold is counted
+        from the table statistics instead.
+        """
+        if self.count_estimate_threshold is not None and not queryset.query.where:
+            estimate = estimate_count(queryset.model, queryset.db)
+            if estimate is not None and estimate >= self.count_estimate_threshold:
+                return estimate
+            pass
+        return cached_count(queryset)
 
     def total(self):
         """Total dataset size."""
-        return self.object_list.count()
+        return self.count_records(self.unfiltered_object_list)
 
     def total_filtered(self):
         """Dataset size with filter applied."""
-        return self.object_list.count()
+        return self.count_records(self.object_list)
 
     def get_ordering(self):
-        """Return the field or fields to use for ordering the queryset."""
+        """Return the field or fields to use for ordering the queryset.
+
+        Only the columns of `get_sortable_columns()` are sorted by,
+        the default ordering is used if none of the requested columns
+        is. The pk is always appended as the tiebreaker, so the pages
+        stay stable.
+        """
+        ordering = []
         if self.request_form.is_valid():
-            ordering = []
             requested_order = self.request_form.cleaned_data['ordering']
+            sortable = self.get_sortable_columns()
             for spec in requested_order:
                 column_num, column_dir = spec.get('column', 0), spec.get('dir', 'asc')
 
                 try:
-                    order = self.get_list_display()[int(column_num)]
-                    if column_dir == 'asc':
-                        order = '-' + order
-                except (IndexError, TypeError):
+                    column = self.get_list_display()[int(column_num)]
+                    order = sortable[column]
+                except (IndexError, TypeError, ValueError):
                     """ Skip """
+                except KeyError:
+                    logger.debug("{} is not sortable by '{}'".format(self.__class__.__name__, column))
                 else:
-                    ordering.append(order)
-            return ordering
-        else:
-            return self.ordering
+                    if isinstance(order, six.string_types):
+                        order = [order]
+                    if column_dir == 'asc':
+                        order = [name[1:] if name.startswith('-') else '-' + name for name in order]
+                    ordering.extend(order)
+            pass
+        if not ordering:
+            ordering = self.get_default_ordering()
+            pass
+        return self._add_pk_tiebreaker(ordering)
+
+    def get_default_ordering(self):
+        """Return `ordering`, or the model Meta ordering if not set."""
+        if self.ordering:
+            if isinstance(self.ordering, six.string_types):
+                return [self.ordering]
+            return list(self.ordering)
+        return list(self._get_list_model()._meta.ordering)
+
+    def _get_list_model(self):
+        # called by get_queryset(), before the object list is there
+        model = getattr(self, 'model', None)
+        if model is None:
+            model = self.queryset.model
+        return model
+
+    def _add_pk_tiebreaker(self, ordering):
+        pk_names = ('pk', self._get_list_model()._meta.pk.name)
+        last = 'pk'
+        for spec in ordering:
+            if isinstance(spec, six.string_types):
+                if spec.lstrip('-') in pk_names:
+                    return ordering
+                last = spec
+                pass
+            pass
+        return ordering + ['-pk' if last.startswith('-') else 'pk']
 
     def get(self, request, *args, **kwargs):
         """Response with rendered html template."""
@@ -331,32 +1056,282 @@ class DataTableMixin(ContextMixin):
         draw = self.request_form.cleaned_data['draw']
         start = self.request_form.cleaned_data['start']
         length = self.request_form.cleaned_data['length']
+        cursor = self.request_form.cleaned_data.get('cursor')
+
+        # The table versions of a cache local to the process do not see
+        # the writes of the other workers.
+        etag = self.get_json_etag() if is_cache_shared() else None
+        response = get_conditional_response(request, etag=etag) if etag else None
+        if response is None:
+            content = self.iter_json_data(draw, start, length, cursor)
+            if length > self.stream_threshold:
+                response = StreamingHttpResponse(content, content_type='application/json')
+            else:
+                response = HttpResponse(''.join(content), content_type='application/json')
+            pass
+        if etag:
+            response['ETag'] = etag
+            pass
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
 
-        result = []
-        for item, columns_data in self.get_table_data(start, length):
-            for header, data in columns_data.items():
-                columns_data[header] = conditional_escape(data)
-            result.append(columns_data)
-
-        data = {
-            "draw": draw,
-            "recordsTotal": self.total(),
-            "recordsFiltered": self.total_filtered(),
-            "data": result
-        }
+    def get_json_etag(self):
+        """Return the ETag of the datatable response.
+
+        The ETag is made from the request parameters but `draw`, the
+        user and the versions of the tables the page is read from,
+        including `row_cache_models`, so it is known without querying
+        the rows.
+        """
+        params = sorted((key, values) for key, values in self.request.GET.lists()
+                        if key not in ('datatable-draw', '_'))
+        tables = [self.object_list.model._meta.db_table] + self.get_row_cache_tables()
+        digest = hashlib.md5(repr((
+            self.__class__.__module__, self.__class__.__name__,
+            self.request.user.pk, self.get_row_cache_role(), get_language(),
+            timezone.get_current_timezone_name(), params,
+            sorted(get_table_versions(tables).items()),
+        )).encode('utf-8'))
+        return quote_etag(digest.hexdigest())
+
+    def iter_json_data(self, draw, start, length, cursor=None):
+        """Encode the datatable response JSON piece by piece.
+
+        The rows are encoded while they are read from the database, in
+        chunks of `stream_chunk_size`, so a long page does not have to
+        be held in memory.
+        """
+        encode = DjangoJSONEncoder().encode
+        yield '{{"draw": {}, "recordsTotal": {}, "recordsFiltered": {}, "columns": {}, "rows": ['.format(
+            encode(draw), encode(self.total()), encode(self.total_filtered()),
+            encode(list(self.get_table_columns())))
+
+        if self.row_cache and is_cache_shared():
+            rows = self.get_cached_table_data(start, length, cursor)
+        else:
+            rows = ((item, [conditional_escape(value) for value in row])
+                    for item, row in self.get_table_data(start, length, cursor))
+        item = None
+        count = 0
+        buffer = []
+        for item, row in rows:
+            buffer.append(encode(row))
+            count += 1
+            if len(buffer) == self.stream_chunk_size:
+                yield (', ' if count > len(buffer) else '') + ', '.join(buffer)
+                buffer = []
+                pass
+            pass
+        if buffer:
+            yield (', ' if count > len(buffer) else '') + ', '.join(buffer)
+        yield ']'
+
+        if self.keyset_pagination and item is not None:
+            next_start = start + count
+            next_key = self.encode_cursor(next_start, item)
+            if next_key is not None:
+                yield ', "cursor": {}'.format(encode({"start": next_start, "key": next_key}))
+                pass
+            pass
+        yield '}'
+
+    def get_export_value(self, item, field_name, value):
+        """Plain column value for the exports.
+
+        Numbers, booleans, dates and times are kept as they are, so the
+        JSON exports have them in their own types.
+        """
+        if value is None:
+            return self.empty_value_display
+        elif isinstance(value, (bool, float, decimal.Decimal, datetime.date, datetime.time) + six.integer_types):
+            return value
+        elif isinstance(value, (list, tuple)):
+            return ', '.join(force_text(v) for v in value)
+        else:
+            return force_text(value)
+
+    def get_export_rows(self):
+        """Iterate over the exported rows as lists of column values.
+
+        The queryset is read in chunks of `export_chunk_size` rows, so
+        the memory use does not grow with the list size.
+        """
+        table_columns = list(self.get_table_columns().values())
+        rows = self.get_rows(self.object_list).iterator(chunk_size=self.export_chunk_size)
+        while True:
+            chunk = list(itertools.islice(rows, self.export_chunk_size))
+            if not chunk:
+                break
+            self.prepare_items(chunk)
+            for item in chunk:
+                yield [self.get_export_value(item, column.name, column.get_export_value(item))
+                       for column in table_columns]
+                pass
+            pass
+
+    def get_export_filename(self, export_format):
+        """File name of the exported list."""
+        return '{}.{}'.format(self.object_list.model._meta.model_name, export_format)
+
+    def export_csv(self):
+        """Stream the list as CSV, the first row is the column titles."""
+        writer = csv.writer(_EchoBuffer())
+        headers = [force_text(label) for field_name, label in self.get_headers_data()]
+        rows = (writer.writerow(row) for row in self.get_export_rows())
+        return StreamingHttpResponse(itertools.chain([writer.writerow(headers)], rows),
+                                     content_type='text/csv; charset=utf-8')
+
+    def export_ndjson(self):
+        """Stream the list as newline delimited JSON objects."""
+        names = list(self.get_table_columns())
+        rows = (json.dumps(dict(zip(names, row)), cls=DjangoJSONEncoder) + '\n'
+                for row in self.get_export_rows())
+        return StreamingHttpResponse(rows, content_type='application/x-ndjson')
+
+    def get_export_data(self, request, *args, **kwargs):
+        """Return the whole list as a streaming file download."""
+        export_format = request.GET['export']
+        response = getattr(self, 'export_{}'.format(export_format))()
+        response['Content-Disposition'] = 'attachment; filename="{}"'.format(
+            self.get_export_filename(export_format))
+        return response
+
+    def get_queryset_plan(self, model):
+        """Return the `QuerySetPlan` for the listed model.
+
+        The plan is derived from `list_display`, `list_display_links`
+        and the module `model_key_map`, and is cached per view class
+        and columns.
+        """
+        key = (self.__class__, model, self.get_columns_key())
+        plan = _queryset_plan_cache.get(key)
+        if plan is None:
+            plan = self.build_queryset_plan(model)
+            _queryset_plan_cache[key] = plan
+            pass
+        return plan
+
+    def build_queryset_plan(self, model):
+        """Build the `QuerySetPlan` for the listed model.
+
+        Forward relations shown in the list or used to build the item
+        links are joined with `select_related`, multi-valued relations
+        are prefetched. When every column is a model field, only the
+        referenced columns of the listed model are loaded.
+        """
+        if self.list_select_related is False:
+            return QuerySetPlan()
+
+        opts = model._meta
+        list_display = self.get_list_display()
+        select_related = []
+        prefetch_related = []
+        only = [opts.pk.name]
+
+        for field_name in list_display:
+            try:
+                field = opts.get_field(field_name)
+            except FieldDoesNotExist:
+                # Callables and data sources may read any field
+                only = None
+                continue
+            if field.many_to_many or field.one_to_many:
+                prefetch_related.append(field_name)
+                continue
+            if field.many_to_one or field.one_to_one:
+                select_related.append(field_name)
+                pass
+            if only is not None and field.concrete:
+                only.append(field_name)
+                pass
+            pass
+
+        if self.get_list_display_links(list_display):
+            for path in _get_model_key_paths(model):
+                path_model, relations = model, []
+                for name in path[:-1]:
+                    try:
+                        field = path_model._meta.get_field(name)
+                    except FieldDoesNotExist:
+                        break
+                    if not (field.many_to_one or field.one_to_one):
+                        break
+                    relations.append(name)
+                    path_model = field.related_model
+                    pass
+                if relations:
+                    select_related.append('__'.join(relations))
+                    pass
+                if only is not None:
+                    only.append(path[0])
+                    pass
+                pass
+            pass
+
+        if self.list_select_related is not True:
+            select_related.extend(self.list_select_related)
+            pass
+
+        if only is not None:
+            only.extend(name.split('__')[0] for name in select_related)
+            concrete_fields = {field.name for field in opts.concrete_fields}
+            only = [name for name in only if name in concrete_fields]
+            pass
 
-        return JsonResponse(data)
+        return QuerySetPlan(
+            select_related=OrderedDict.fromkeys(select_related),
+            prefetch_related=OrderedDict.fromkeys(prefetch_related),
+            only=OrderedDict.fromkeys(only) if only is not None else None)
+
+    def get_search_term(self):
+        """Return the search box value of the datatable request."""
+        if self.search_fields and self.request_form.is_valid():
+            return self.request_form.cleaned_data['search']
+        return ''
+
+    def get_search_lookups(self):
+        """Return the queryset lookups for `search_fields`.
+
+        Like the django admin, the field name prefix selects the match:
+        '=' is an exact match. Without a prefix (or with '^') the field
+        has to start with the search term, so the database can use the
+        column index.
+        """
+        lookups = []
+        for field_name in self.search_fields:
+            if field_name.startswith('='):
+                lookups.append('{}__iexact'.format(field_name[1:]))
+            else:
+                lookups.append('{}__istartswith'.format(field_name.lstrip('^')))
+                pass
+            pass
+        return lookups
+
+    def search_object_list(self, queryset):
+        """Apply the datatable search to the queryset."""
+        term = self.get_search_term()
+        if not term:
+            return queryset
+        condition = Q()
+        for lookup in self.get_search_lookups():
+            condition |= Q(**{lookup: term})
+            pass
+        return queryset.filter(condition)
 
     def get_object_list(self):
         """Create prepared queryset for datatables view."""
-        return self.get_queryset()
+        queryset = self.get_queryset()
+        return self.get_queryset_plan(queryset.model).apply(queryset)
 
     def dispatch(self, request, *args, **kwargs):
         """Handle for browser HTTP and AJAX requests from datatables."""
         self.request_form = forms.DatatableRequestForm(request.GET, prefix='datatable')
-        self.object_list = self.get_object_list()
+        self.unfiltered_object_list = self.get_object_list()
+        self.object_list = self.search_object_list(self.unfiltered_object_list)
         if 'HTTP_DATATABLE' in request.META:
             handler = self.get_json_data
+        elif request.method == 'GET' and request.GET.get('export') in self.export_formats:
+            handler = self.get_export_data
         elif request.method.lower() in self.http_method_names:
             handler = getattr(
                 self, request.method.lower(), self.http_method_not_allowed)
@@ -365,7 +1340,7 @@ class DataTableMixin(ContextMixin):
         return handler(request, *args, **kwargs)
 
 
-class ListModelView(TemplateResponseMixin, DataTableMixin, View):
+class ListModelView(URLObjectMixin, TemplateResponseMixin, DataTableMixin, View):
     """List view suitable to work with jQuery Datatables.
 
     The view responsive for handling GET/POST requests from the browser
@@ -386,6 +1361,47 @@ class ListModelView(TemplateResponseMixin, DataTableMixin, View):
     :keyword list_display_links: List of fields form `list_display`
                                  linked to update view
 
+    :keyword keyset_pagination: Look up the next page by the ordering
+                                key of the previous page's last row
+                                instead of the OFFSET.
+
+    :keyword count_estimate_threshold: Report the table statistics row
+                                       estimate as the total when it
+                                       exceeds this number of rows.
+
+    :keyword search_fields: Fields matched with the datatable search
+                            box value. Prefix the name with '=' for an
+                            exact match.
+
+    :keyword export_formats: Formats offered with `?export=<format>`.
+                             Each one is served by `export_<format>`.
+
+    :keyword use_values_list: Fetch the rows with `values_list()`
+                              when all columns are plain model fields.
+
+    :keyword list_select_related: Derive `select_related`,
+                                  `prefetch_related` and `only` for the
+                                  queryset from the displayed columns.
+                                  False disables it, a list of relations
+                                  is joined in addition to derived ones.
+
+    :keyword sortable_columns: Dict of the sortable columns to their
+                               ordering expressions, by default the
+                               indexed model field columns.
+
+    :keyword stream_threshold: Page length above which the datatable
+                               response is streamed.
+
+    :keyword row_cache: Cache the rendered rows of the datatable pages.
+                        Rows are invalidated with `bump_row_version()`
+                        and the table versions of `row_cache_models`.
+                        Only used with a cache shared by the workers.
+
+    :keyword row_cache_models: Models read while the cells are formatted,
+                               like UserProfile for the user columns.
+                               Their table versions are in the row
+                               cache keys and the datatable ETag.
+
     """
 
     model = None
@@ -494,24 +1510,28 @@ class ListModelView(TemplateResponseMixin, DataTableMixin, View):
             queryset = queryset.order_by(*ordering)
         return queryset
 
+    def format_boolean(self, value):
+        return format_html('<i class="material-icons">{}</i>'.format(
+            'check' if value else 'close'
+        ))
+
     def format_column(self, item, field_name, value):
-        if isinstance(value, bool):
-            return format_html('<i class="material-icons">{}</i>'.format(
-                'check' if value else 'close'
-            ))
-        else:
-            formatted = super(ListModelView, self).format_column(item, field_name, value)
-            field_url = None
-            if field_name in self.get_list_display_links(self.get_list_display()):
-                field_url = self.get_item_url(item)
-                pass
-            else:
-                field_url = self.get_field_url(item, field_name, value)
-                pass
-            if field_url:
-                formatted = format_html('<a href="{}">{}</a>', field_url, formatted)
-                pass
+        column = self.get_table_columns()[field_name]
+        formatted = column.formatter(value)
+        if isinstance(value, bool) and not getattr(column.attr, 'choices', None):
+            # boolean icons are not linked
             return formatted
+        field_url = None
+        if column.linked:
+            field_url = self.get_item_url(item)
+            pass
+        else:
+            field_url = self.get_field_url(item, field_name, value)
+            pass
+        if field_url:
+            formatted = format_html('<a href="{}">{}</a>', field_url, formatted)
+            pass
+        return formatted
 
 
     def get_field_url(self, item, field_name, value):
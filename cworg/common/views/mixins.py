@@ -6,6 +6,7 @@ from django.contrib import messages
 from django.core.exceptions import PermissionDenied, ValidationError, SuspiciousOperation
 from django.forms.models import modelform_factory
 from django.http import Http404
+from django.shortcuts import get_object_or_404
 from django.urls import reverse
 from django.utils.encoding import force_text
 from django.utils.html import format_html
@@ -31,7 +32,29 @@ def _collect_elements(parent, container=None):
     return container
 
 
-class ModelViewMixin(object):
+class URLObjectMixin(object):
+    """Resolve the objects named by the URL keyword arguments.
+
+    Nested views, like the attendees of a meet, look the parent object
+    up in the permission check, the queryset and the context. The
+    object is looked up once and shared for the request.
+    """
+
+    def get_url_object(self, model, lookup='slug', kwarg='slug', select_related=()):
+        """Return the `model` object whose `lookup` is the URL `kwarg`, or raise Http404."""
+        resolved = self.__dict__.setdefault('_url_objects', {})
+        key = (model, lookup, kwarg)
+        if key not in resolved:
+            queryset = model._default_manager.all()
+            if select_related:
+                queryset = queryset.select_related(*select_related)
+                pass
+            resolved[key] = get_object_or_404(queryset, **{lookup: self.kwargs.get(kwarg)})
+            pass
+        return resolved[key]
+
+
+class ModelViewMixin(URLObjectMixin):
     """Mixin for generic form views to play nice with `ModelViewSet`."""
 
     viewset = None
@@ -123,6 +123,30 @@ DATABASES = {
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/3.0/topics/cache/
+#
+# List counts and other cached data are invalidated through table
+# versions kept in the cache (see common/cache.py), so the cache must be
+# shared by all the worker processes. With a process local cache
+# (locmem, dummy) the cached data is not used. The cache table is
+# created with "python manage.py createcachetable" (make migration).
+#
+# A culled table or row version drops the cached data built on it, so
+# MAX_ENTRIES is well above the number of the table versions, the row
+# versions and rows of the listed models, the counts and the display
+# names.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'cworg_cache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 200000,
+        },
+    }
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
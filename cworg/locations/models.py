@@ -1,14 +1,15 @@
 from django.db import models
-from django.db.models.signals import pre_save
+from django.db.models.signals import post_save, pre_save
 from django.utils.translation import ugettext_lazy as _
-from common.constant import REST_KEYWORDS
+from common.cache import bump_row_version
+from common.models import ChangeTrackingMixin, SlugModelMixin
 from django.utils.text import slugify
 from django.utils.safestring import mark_safe
 
 
-class Location(models.Model):
+class Location(ChangeTrackingMixin, SlugModelMixin, models.Model):
     slug = models.SlugField(unique=True)
-    name = models.CharField(max_length=100, default='Unknown location')
+    name = models.CharField(max_length=100, default='Unknown location', db_index=True)
 
     address = models.CharField(max_length=200, blank=True)
     coordinates = models.CharField(max_length=200, blank=True)
@@ -22,26 +23,19 @@ class Location(models.Model):
         ordering = ("id",)
         pass
 
+    # Avoid the conflict with the URLs of the locations.
+    slug_reserved = ['location', 'locations']
+
     def __str__(self):
         return self.name
 
+    def get_slug_base(self):
+        return slugify(self.name)
+
     pass
 
-def create_location_slug(instance, new_slug=None):
-    slug = slugify(instance.name)
-    if new_slug is not None:
-        slug = new_slug
-        pass
-    # If the slug is REST verbs, avoid the conflict.
-    exists = slug in REST_KEYWORDS or slug in ['location', 'locations' ]
-    if not exists:
-        qs = Location.objects.filter(slug=slug).order_by("-id")
-        exists = qs.exists()
-        pass
-    if exists:
-        new_slug = "%s-%s" %(slug, qs.first().id)
-        return create_location_slug(instance, new_slug=new_slug)
-    return slug
+def create_location_slug(instance):
+    return instance.allocate_slug()
 
 
 def pre_save_location_receiver(sender, instance, *args, **kwargs):
@@ -49,6 +43,17 @@ def pre_save_location_receiver(sender, instance, *args, **kwargs):
     if not instance.slug:
         instance.slug = create_location_slug(instance)
         pass
+    # The row version is bumped once the row is written, see post_save.
+    instance._row_changed = instance.has_changed()
     pass
 
 pre_save.connect(pre_save_location_receiver, sender=Location)
+
+
+def post_save_location_receiver(sender, instance, created, *args, **kwargs):
+    if instance._row_changed and not created:
+        bump_row_version(sender, instance.pk)
+        pass
+    pass
+
+post_save.connect(post_save_location_receiver, sender=Location)
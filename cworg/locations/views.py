@@ -34,6 +34,8 @@ class LocationListView(ListModelView):
     allow_empty = True
 
     list_display = ["name", "address", "googlemap_url", "phone", "homepage", ]
+    search_fields = ["name"]
+    row_cache = True
 
     def get_item_url(self, item):
         """Link to object detail to `list_display_links` columns."""
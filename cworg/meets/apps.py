@@ -24,9 +24,6 @@ class MeetsConfig(SiteModuleMixin, AppConfig):
                       'attendee': lambda mo: [mo.meet.slug, mo.pk],
                       }
 
-    def has_perm(self, user):
-        return True
-
     def index_url(self):
         """Entry url for a site module."""
         return reverse('{}:{}_list'.format(self.label, self.model_map[self.label]))
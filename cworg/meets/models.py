@@ -1,5 +1,5 @@
-from django.db import models
-from django.db.models.signals import pre_save
+from django.db import models, transaction, IntegrityError
+from django.db.models.signals import post_save, pre_save
 from django.contrib.auth.models import Group, User
 
 from django.utils.translation import ugettext_lazy as _
@@ -8,7 +8,8 @@ from django.utils.safestring import mark_safe
 
 from locations.models import Location
 from teams.models import Team, TeamMember
-from common.constant import REST_KEYWORDS
+from common.cache import bump_model_version, bump_row_version
+from common.models import ChangeTrackingMixin, SlugModelMixin, allocate_distinct_slugs
 from cworg.constant import MAX_ATTENDEES
 from userprofile.models import UserProfile
 from django.utils import timezone
@@ -19,12 +20,12 @@ import uuid
 
 
 # One 
-class Meet(models.Model):
+class Meet(ChangeTrackingMixin, SlugModelMixin, models.Model):
     slug = models.SlugField(unique=True)
-    name = models.CharField(max_length=100, default='Unnamed Event')
+    name = models.CharField(max_length=100, default='Unnamed Event', db_index=True)
     team = models.ForeignKey(Team, related_name="team", on_delete=models.SET_NULL, null=True, blank=True)
     group = models.ForeignKey(Group, related_name="group", on_delete=models.SET_NULL, null=True, blank=True)
-    starttime = models.DateTimeField('Meet date/time')
+    starttime = models.DateTimeField('Meet date/time', db_index=True)
     duration = models.DurationField('Duration', default=90)
     location = models.ForeignKey(Location, on_delete=models.SET_NULL, null=True, blank=True)
     manager = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
@@ -32,9 +33,15 @@ class Meet(models.Model):
     max_attendees = models.PositiveIntegerField(default=1)
     comments = models.CharField(max_length=200, null=True, blank=True, default='')
 
+    # Avoid the conflict with the URLs of the meets.
+    slug_reserved = ['attendance', 'attendees', 'attendee', 'meets', 'meet', 'series']
+
     def __str__(self):
         return self.name
 
+    def get_slug_base(self):
+        return slugify("{}-{}".format(self.name, str(self.starttime)))
+
     # def attendee_set(self):
     #     return Attendee.objects.filter(meet=self.id).filter(player__isnull=False)
 
@@ -45,16 +52,21 @@ class Meet(models.Model):
         return mark_safe(markdown(self.comments))
 
     def save(self, *args, **kwargs):
-        # Check how the current values differ from ._loaded_values. For example,
-        # prevent changing the creator_id of the model. (This example doesn't
-        # support cases where 'creator_id' is deferred).
+        # The slots depend on the min. attendees and the team only, saving
+        # the other fields does not touch the attendees.
+        allocate = self.has_changed('min_attendees', 'team')
 
-        if self.manager is None:
+        if self.manager_id is None:
             self.manager = self.team.owner
             pass
-        super().save(*args, **kwargs)
-
-        Attendee.allocate_slots(self, self.min_attendees)
+        if allocate:
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+                Attendee.allocate_slots(self, self.min_attendees)
+                pass
+        else:
+            super().save(*args, **kwargs)
+            pass
         pass
 
     class Meta:
@@ -66,40 +78,46 @@ class Meet(models.Model):
     pass
 
 
-def create_meet_slug(instance, new_slug=None):
-    if new_slug is not None:
-        slug = new_slug
-    else:
-        datestring = str(instance.starttime)
-        slug = slugify("{}-{}".format(instance.name, datestring))
-        pass
-    # If the slug is REST verbs, avoid the conflict.
-    exists = slug in REST_KEYWORDS or slug in ['attendance', 'attendees', 'attendee', 'meets', 'meet']
-    if not exists:
-        qs = Meet.objects.filter(slug=slug).order_by("-id")
-        exists = qs.exists()
-        pass
-    if exists:
-        new_slug = "%s-%s" %(slug, qs.first().id)
-        return create_meet_slug(instance, new_slug=new_slug)
-    return slug
+def create_meet_slug(instance):
+    return instance.allocate_slug()
 
 
 def pre_save_meet_receiver(sender, instance, *args, **kwargs):
     # 100 attendance is the absolute max
-    instance.min_attendees = min(MAX_ATTENDEES, instance.min_attendees)
-    instance.max_attendees = max(instance.max_attendees, instance.min_attendees)
+    if instance.has_changed('min_attendees', 'max_attendees'):
+        instance.min_attendees = min(MAX_ATTENDEES, instance.min_attendees)
+        instance.max_attendees = max(instance.max_attendees, instance.min_attendees)
+        pass
 
     if not instance.slug:
         instance.slug = create_meet_slug(instance)
         pass
+    # The row version is bumped once the row is written, see post_save.
+    instance._row_changed = instance.has_changed()
     pass
 
 pre_save.connect(pre_save_meet_receiver, sender=Meet)
 
 
+def post_save_meet_receiver(sender, instance, created, *args, **kwargs):
+    if instance._row_changed and not created:
+        bump_row_version(sender, instance.pk)
+        pass
+    pass
+
+post_save.connect(post_save_meet_receiver, sender=Meet)
+
+
 # Attendee
 
+def make_attendee_token():
+    return uuid.uuid4().hex
+
+
+def make_token_expiration():
+    return timezone.datetime.now() + datetime.timedelta(1, 0)
+
+
 class Attendee(models.Model):
     class Attendance(models.TextChoices):
         NO         = '--', _('Unassinged')
@@ -116,8 +134,8 @@ class Attendee(models.Model):
                                   default=Attendance.NO)
     substitute = models.ForeignKey(User, on_delete=models.SET_NULL, blank=True, null=True, related_name="substitute")
 
-    token = models.CharField(max_length=32, unique=True, default=uuid.uuid4().hex)
-    token_expiration = models.DateTimeField('Token expiration time', default=timezone.datetime.now()+datetime.timedelta(1, 0))
+    token = models.CharField(max_length=32, unique=True, default=make_attendee_token)
+    token_expiration = models.DateTimeField('Token expiration time', default=make_token_expiration)
 
     class Meta:
         constraints = [
@@ -139,14 +157,33 @@ class Attendee(models.Model):
 
 
     def allocate_slots(meet, min_slots):
-        current_slots = Attendee.objects.filter(meet=meet).count()
-        
-        if current_slots < min_slots:
-            attendees = []
-            for i in range(min_slots - current_slots):
-                attendees.append(Attendee(meet=meet, player=None, attendance=Attendee.Attendance.NO, substitute=None))
+        """Make the meet have min_slots attendee slots.
+
+        Missing slots are added, and the unassigned slots above min_slots
+        are deleted, newest first. The meet row is locked for the
+        transaction, so concurrent allocations for the same meet run one
+        after the other and see each other's slots.
+        """
+        with transaction.atomic():
+            list(Meet.objects.select_for_update().filter(pk=meet.pk).values_list('pk', flat=True))
+            slots = Attendee.objects.filter(meet=meet)
+            current_slots = slots.count()
+
+            if current_slots < min_slots:
+                attendees = []
+                for i in range(min_slots - current_slots):
+                    attendees.append(Attendee(meet=meet, player=None, attendance=Attendee.Attendance.NO, substitute=None))
+                    pass
+                Attendee.objects.bulk_create(attendees)
+                bump_model_version(Attendee)
+            elif current_slots > min_slots:
+                unassigned = slots.filter(player__isnull=True, substitute__isnull=True,
+                                          attendance=Attendee.Attendance.NO).order_by('-id')
+                extra = list(unassigned.values_list('pk', flat=True)[:current_slots - min_slots])
+                if extra:
+                    Attendee.objects.filter(pk__in=extra).delete()
+                    pass
                 pass
-            Attendee.objects.bulk_create(attendees)
             pass
         pass
 
@@ -165,12 +202,116 @@ def pre_save_attendee_receiver(sender, instance, *args, **kwargs):
         pass
 
     if not instance.token:
-        instance.token = uuid.uuid4().hex
+        instance.token = make_attendee_token()
         pass
     pass
 
 pre_save.connect(pre_save_attendee_receiver, sender=Attendee)
 
+
+#
+# Meet series
+#
+SERIES_INTERVALS = {
+    'weekly': datetime.timedelta(days=7),
+    'biweekly': datetime.timedelta(days=14),
+}
+
+# Two years of weekly meets
+MAX_SERIES_MEETS = 104
+
+
+def get_series_starttimes(starttime, interval, count=None, until=None):
+    """Return the start times of a series of meets.
+
+    The series repeats every interval at the same local time, across
+    the DST changes, and ends after count meets or with the last meet
+    starting on or before the until date.
+    """
+    aware = timezone.is_aware(starttime)
+    if aware:
+        tz = timezone.get_current_timezone()
+        starttime = timezone.localtime(starttime, tz).replace(tzinfo=None)
+        pass
+
+    starttimes = []
+    while len(starttimes) < MAX_SERIES_MEETS:
+        if count is not None and len(starttimes) >= count:
+            break
+        if until is not None and starttime.date() > until:
+            break
+        starttimes.append(timezone.make_aware(starttime, tz, is_dst=False) if aware else starttime)
+        starttime += interval
+        pass
+    return starttimes
+
+
+def create_meet_series(meet, interval, count=None, until=None):
+    """Create the meets of a series repeating the unsaved meet.
+
+    Every meet of the series is a copy of the meet, which also gives the
+    first start time. The slugs are allocated for all the meets at once,
+    and the meets and their attendee slots are inserted with two
+    bulk_create in one transaction. A slug taken by a concurrent insert
+    fails the unique constraint, and the series is retried. Returns the
+    created meets.
+    """
+    if count is None and until is None:
+        raise ValueError("A meet series needs a count or an end date.")
+    if isinstance(interval, str):
+        interval = SERIES_INTERVALS[interval]
+        pass
+
+    # What Meet.save and pre_save_meet_receiver do, bulk_create skips them.
+    if meet.manager_id is None and meet.team_id is not None:
+        meet.manager_id = meet.team.owner_id
+        pass
+    meet.min_attendees = min(MAX_ATTENDEES, meet.min_attendees)
+    meet.max_attendees = max(meet.max_attendees, meet.min_attendees)
+
+    values = {field.attname: getattr(meet, field.attname) for field in Meet._meta.concrete_fields
+              if not field.primary_key and field.name not in ('slug', 'starttime')}
+    meets = [Meet(starttime=starttime, **values)
+             for starttime in get_series_starttimes(meet.starttime, interval, count=count, until=until)]
+    if not meets:
+        return meets
+
+    for attempt in range(Meet.slug_retries):
+        slugs = allocate_distinct_slugs(Meet, [item.get_slug_base() for item in meets], reserved=Meet.slug_reserved)
+        for item, slug in zip(meets, slugs):
+            item.pk = None
+            item.slug = slug
+            pass
+        try:
+            with transaction.atomic():
+                Meet.objects.bulk_create(meets)
+                if any(item.pk is None for item in meets):
+                    # The backend does not return the pks of the inserted rows
+                    pks = dict(Meet.objects.filter(slug__in=slugs).values_list('slug', 'pk'))
+                    for item in meets:
+                        item.pk = pks[item.slug]
+                        pass
+                    pass
+                attendees = []
+                for item in meets:
+                    for i in range(item.min_attendees):
+                        attendees.append(Attendee(meet=item, player=None, attendance=Attendee.Attendance.NO, substitute=None))
+                        pass
+                    pass
+                Attendee.objects.bulk_create(attendees)
+                pass
+            break
+        except IntegrityError:
+            taken = Meet.objects.filter(slug__in=slugs).exists()
+            if not taken or attempt + 1 == Meet.slug_retries:
+                raise
+            pass
+        pass
+
+    bump_model_version(Meet)
+    bump_model_version(Attendee)
+    return meets
+
 #
 # Assignment
 #
@@ -1,6 +1,12 @@
-from django.test import TestCase
+import datetime
 
-from .models import Meet
+from django.contrib.auth.models import User
+from django.test import Client, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from teams.models import Team
+from .models import Meet, Attendee, MAX_SERIES_MEETS, SERIES_INTERVALS, create_meet_series, get_series_starttimes
 
 # Create your tests here.
 
@@ -9,3 +15,133 @@ class GetAttendeesTests(TestCase):
         pass
     pass
 
+
+class AllocateSlotsTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user('owner', password='pw')
+        self.player = User.objects.create_user('player', password='pw')
+        self.team = Team.objects.create(name='Wednesday', owner=self.owner, join_password='x')
+        self.meet = Meet.objects.create(name='Doubles', team=self.team, min_attendees=2, max_attendees=4,
+                                        starttime=timezone.now(), duration=datetime.timedelta(minutes=90))
+        pass
+
+    def get_slots(self):
+        return list(Attendee.objects.filter(meet=self.meet).order_by('id'))
+
+    def test_new_meet_slots(self):
+        self.assertEqual(len(self.get_slots()), 2)
+        pass
+
+    def test_grow(self):
+        before = [slot.pk for slot in self.get_slots()]
+        self.meet.min_attendees = 4
+        self.meet.save()
+        slots = self.get_slots()
+        self.assertEqual(len(slots), 4)
+        # the existing slots are kept
+        self.assertEqual([slot.pk for slot in slots[:2]], before)
+        pass
+
+    def test_shrink_deletes_newest_unassigned(self):
+        self.meet.min_attendees = 4
+        self.meet.save()
+        first, second, third, newest = self.get_slots()
+        newest.player = self.player
+        newest.save()
+
+        self.meet.min_attendees = 2
+        self.meet.save()
+        self.assertEqual([slot.pk for slot in self.get_slots()], [first.pk, newest.pk])
+        pass
+
+    def test_shrink_keeps_assigned(self):
+        for slot in self.get_slots():
+            slot.player = User.objects.create_user('player-%d' % slot.pk, password='pw')
+            slot.save()
+            pass
+        self.meet.min_attendees = 1
+        self.meet.save()
+        self.assertEqual(len(self.get_slots()), 2)
+        pass
+
+    def test_unrelated_change_does_not_allocate(self):
+        Attendee.objects.filter(pk=self.get_slots()[0].pk).delete()
+        meet = Meet.objects.get(pk=self.meet.pk)
+        meet.comments = 'Bring balls'
+        with self.assertNumQueries(1):
+            meet.save()
+        self.assertEqual(len(self.get_slots()), 1)
+        pass
+
+    pass
+
+
+class MeetSeriesTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_superuser('owner', 'owner@example.com', 'pw')
+        self.team = Team.objects.create(name='Wednesday', owner=self.owner, join_password='x')
+        pass
+
+    def make_meet(self, starttime):
+        return Meet(name='Doubles', team=self.team, manager=self.owner, min_attendees=2, max_attendees=4,
+                    starttime=starttime, duration=datetime.timedelta(minutes=90))
+
+    def test_starttimes_keep_local_time(self):
+        with timezone.override('America/New_York'):
+            first = timezone.make_aware(datetime.datetime(2026, 10, 21, 19, 0))
+            starttimes = get_series_starttimes(first, SERIES_INTERVALS['weekly'], count=3)
+            self.assertEqual([timezone.localtime(t).time() for t in starttimes], [datetime.time(19, 0)] * 3)
+            self.assertEqual([timezone.localtime(t).date() for t in starttimes],
+                             [datetime.date(2026, 10, 21), datetime.date(2026, 10, 28), datetime.date(2026, 11, 4)])
+            # the daylight saving time ends on Nov. 1
+            self.assertEqual(starttimes[2] - starttimes[1], datetime.timedelta(days=7, hours=1))
+            pass
+        pass
+
+    def test_starttimes_until(self):
+        first = datetime.datetime(2026, 1, 7, 19, 0)
+        starttimes = get_series_starttimes(first, SERIES_INTERVALS['biweekly'], until=datetime.date(2026, 2, 4))
+        self.assertEqual(starttimes, [datetime.datetime(2026, 1, 7, 19, 0), datetime.datetime(2026, 1, 21, 19, 0),
+                                      datetime.datetime(2026, 2, 4, 19, 0)])
+        many = get_series_starttimes(first, SERIES_INTERVALS['weekly'], count=MAX_SERIES_MEETS + 10)
+        self.assertEqual(len(many), MAX_SERIES_MEETS)
+        pass
+
+    def test_create_series(self):
+        first = timezone.make_aware(datetime.datetime(2026, 1, 7, 19, 0))
+        meets = create_meet_series(self.make_meet(first), 'weekly', count=4)
+        self.assertEqual(len(meets), 4)
+        self.assertEqual(Meet.objects.count(), 4)
+        self.assertEqual([meet.starttime for meet in Meet.objects.order_by('starttime')],
+                         [first + datetime.timedelta(days=7 * n) for n in range(4)])
+        for meet in meets:
+            self.assertEqual(Attendee.objects.filter(meet=meet).count(), 2)
+            pass
+
+        # the same series again gets other slugs
+        create_meet_series(self.make_meet(first), 'weekly', count=4)
+        slugs = list(Meet.objects.values_list('slug', flat=True))
+        self.assertEqual(len(slugs), 8)
+        self.assertEqual(len(set(slugs)), 8)
+        self.assertEqual(Attendee.objects.count(), 16)
+        pass
+
+    def test_create_series_needs_an_end(self):
+        with self.assertRaises(ValueError):
+            create_meet_series(self.make_meet(timezone.now()), 'weekly')
+        pass
+
+    def test_series_create_view(self):
+        client = Client()
+        client.login(username='owner', password='pw')
+        response = client.post(reverse('meets:meet_series_create'), {
+            'name': 'Doubles', 'team': self.team.pk, 'starttime': '2026-01-07 19:00:00',
+            'duration': '01:30:00', 'manager': self.owner.pk, 'min_attendees': 2, 'max_attendees': 4,
+            'comments': '', 'repeat': 'biweekly', 'count': 3,
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Meet.objects.count(), 3)
+        self.assertEqual(Attendee.objects.count(), 6)
+        pass
+
+    pass
@@ -8,6 +8,7 @@ from .views import (
     MeetDetailView,
     MeetUpdateView,
     MeetCreateView,
+    MeetSeriesCreateView,
     MeetDeleteView,
     AttendeeListView,
     AttendeeDetailView,
@@ -18,6 +19,7 @@ from .views import (
 urlpatterns = [
     path('', MeetListView.as_view(), name='meet_list'),
     path('create/', MeetCreateView.as_view(), name='meet_create'),
+    path('series/create/', MeetSeriesCreateView.as_view(), name='meet_series_create'),
     path('<slug:slug>/attendees/<int:pk>/', AttendeeDetailView.as_view(), name='attendee_detail'),
     path('<slug:slug>/attendees/<int:pk>/update/', AttendeeUpdateView.as_view(), name='attendee_update'),
     path('<slug:slug>/attendees/', AttendeeListView.as_view(), name='attendee_list'),
@@ -22,13 +22,14 @@ from django.utils.translation import ugettext_lazy as _
 from cwlog import logger
 
 # User profile
-from userprofile.models import UserProfile
+from userprofile.models import UserProfile, prime_display_names
+from userprofile.forms import UserChoiceField
 from django.contrib.auth.models import User
 
 from teams.models import Team, TeamMember
 
 # CWOrg's library
-from .models import Meet, Attendee, Assignment
+from .models import Meet, Attendee, Assignment, MAX_SERIES_MEETS, SERIES_INTERVALS, create_meet_series
 
 from common.views import ListModelView, DetailModelView, UpdateModelView, CreateModelView, DeleteModelView
 from common.utils import get_today
@@ -48,6 +49,11 @@ class MeetListView(ListModelView):
 
     list_display = ["name", "team", "starttime", "location", "manager"]
     list_display_links = ["name", "starttime"]
+    list_select_related = ["manager__userprofile"]
+    search_fields = ["name"]
+    sortable_columns = {"name": "name", "starttime": "starttime"}
+    keyset_pagination = True
+    row_cache = True
 
     _team_module = module_registry.get_module("teams")
     _location_module = module_registry.get_module("locations")
@@ -59,15 +65,19 @@ class MeetListView(ListModelView):
         pass
 
     def get_context_data(self, **kwargs):
+        """Additional context data for meet list view.
+
+        :keyword series_url: Link to the meet series create view
+        """
         context = super().get_context_data(**kwargs)
+        if context.get('create_url'):
+            context['series_url'] = reverse('meets:meet_series_create')
+            pass
         return context
 
     def get_item_url(self, item):
         """Link to object detail to `list_display_links` columns."""
-        opts = self.model._meta
-        return reverse(
-            '{}:{}_detail'.format(opts.app_label, opts.model_name),
-            args=[item.slug])
+        return self.get_absolute_url(item, 'detail')
 
 
     def has_view_permission(self, request):
@@ -92,7 +102,7 @@ class MeetListView(ListModelView):
         elif field_name == "location" and item.location:
             return self._location_module.get_absolute_url(item.location, 'location', field_verb)
         elif field_name == "manager" and item.manager:
-            manager = UserProfile.objects.get(user=item.manager)
+            manager = getattr(item.manager, 'userprofile', None)
             if manager:
                 return self._userprof_module.get_absolute_url(manager, 'user', 'detail')
             pass
@@ -112,6 +122,7 @@ class MeetDetailForm(forms.ModelForm):
     class Meta:
         model = Meet
         fields = ['name', 'team', 'group', 'starttime', 'duration', 'location', 'manager', 'min_attendees', 'max_attendees']
+        field_classes = {'manager': UserChoiceField}
         pass
 
     pass
@@ -229,6 +240,7 @@ class MeetCreateForm(forms.ModelForm):
     class Meta:
         model = Meet
         exclude = ['slug']
+        field_classes = {'manager': UserChoiceField}
         pass
 
     layout = Layout('name',
@@ -271,6 +283,71 @@ class MeetCreateView(CreateModelView):
 
 
 
+class MeetSeriesForm(MeetCreateForm):
+    """Meet create form repeating the meet weekly or every other week."""
+
+    repeat = forms.ChoiceField(label=_('Repeat'), choices=[('weekly', _('Weekly')), ('biweekly', _('Every other week'))])
+    count = forms.IntegerField(label=_('Number of meets'), required=False, min_value=1, max_value=MAX_SERIES_MEETS)
+    until = forms.DateField(label=_('Last date'), required=False)
+
+    layout = Layout('name',
+                    Row('team', 'group'),
+                    Row('starttime', 'duration', 'location'),
+                    Fieldset('Attendees',
+                             Row('manager', 'min_attendees', 'max_attendees')),
+                    Fieldset('Series',
+                             Row('repeat', 'count', 'until')))
+
+    def clean(self):
+        cleaned_data = super().clean()
+        count = cleaned_data.get('count')
+        until = cleaned_data.get('until')
+        starttime = cleaned_data.get('starttime')
+        if count is None and until is None:
+            raise forms.ValidationError(_('Give the number of meets or the last date of the series.'))
+        if until is not None and starttime is not None:
+            first = timezone.localtime(starttime)
+            interval = SERIES_INTERVALS.get(cleaned_data.get('repeat'))
+            if until < first.date():
+                self.add_error('until', _('The last date is before the first meet.'))
+            elif interval is not None and until >= (first + interval * MAX_SERIES_MEETS).date():
+                self.add_error('until', _('A series has {} meets at most.').format(MAX_SERIES_MEETS))
+                pass
+            pass
+        return cleaned_data
+
+    def save(self, commit=True):
+        """Create the meets of the series, and return the first one."""
+        meet = super().save(commit=False)
+        self.meets = create_meet_series(meet, self.cleaned_data['repeat'],
+                                        count=self.cleaned_data.get('count'),
+                                        until=self.cleaned_data.get('until'))
+        return self.meets[0]
+
+    pass
+
+
+class MeetSeriesCreateView(MeetCreateView):
+    """Create the meets of a series at once."""
+
+    form_class = MeetSeriesForm
+    template_name = "meets/meet_create.html"
+
+    def get_success_url(self):
+        return reverse('meets:meet_list')
+
+    def form_valid(self, form):
+        # message_user() counts the meets of the saved form
+        self.series_form = form
+        return super().form_valid(form)
+
+    def message_user(self):
+        self.success(_('The {count} meets of the series starting with "{link}" were added successfully.'),
+                     count=len(self.series_form.meets))
+
+    pass
+
+
 class MeetDeleteView(DeleteModelView):
 
     model = Meet
@@ -291,49 +368,53 @@ class AttendeeListView(ListModelView):
     allow_empty = True
     # template_name = "meets/attendee_list.html"
     list_display = ["player", "attendance", "substitute"]
+    # the meet and player unique constraint index serves the sort
+    sortable_columns = {"player": "player_id"}
+    keyset_pagination = True
+    # The players are shown by the display name of the user profile
+    row_cache_models = [UserProfile]
+
+    def get_meet(self):
+        """The meet of the URL, with its team for the permission check."""
+        return self.get_url_object(Meet, select_related=['team'])
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        meet_slug = self.kwargs.get('slug')
-        meet = get_object_or_404(Meet, slug=meet_slug)
-        if meet:
-            context['meet'] = meet
-            pass
+        context['meet'] = self.get_meet()
         return context
 
     def get_queryset(self):
         """
         Get the attendees for the meet.
         """
-        meet_slug = self.kwargs.get('slug')
-        get_object_or_404(Meet, slug=meet_slug)
         queryset = super().get_queryset()
-        return queryset.filter(meet__slug=meet_slug)
+        return queryset.filter(meet=self.get_meet())
+
+    def prepare_items(self, items):
+        super().prepare_items(items)
+        prime_display_names([item.player_id for item in items] + [item.substitute_id for item in items])
+        pass
 
     def get_item_url(self, item):
         """Link to object detail to `list_display_links` columns."""
-        opts = self.model._meta
-        if self.request.user.is_staff or item.player==self.request.user:
-            return reverse('{}:{}_update'.format(opts.app_label, opts.model_name),
-                           args=[item.meet.slug, item.pk])
+        if self.request.user.is_staff or item.player_id == self.request.user.id:
+            return self.get_absolute_url(item, 'update')
         else:
-            return reverse('{}:{}_detail'.format(opts.app_label, opts.model_name),
-                           args=[item.meet.slug, item.pk])
+            return self.get_absolute_url(item, 'detail')
 
 
     def has_view_permission(self, request):
-        meet_slug = self.kwargs.get('slug')
-        meet = get_object_or_404(Meet, slug=meet_slug)
-        return Team.objects.filter(id=meet.team.id, teammember__member=request.user).count() > 0
+        meet = self.get_meet()
+        return Team.objects.filter(id=meet.team.id, teammember__member=request.user).exists()
 
 
     pass
 
 
 class AttendeeForm(forms.ModelForm):
-    player = forms.ModelChoiceField(queryset=User.objects.all(), label=_('Player'))
+    player = UserChoiceField(queryset=User.objects.all(), label=_('Player'))
     attendance = forms.ChoiceField(label=_('Attendance'))
-    substitute = forms.ModelChoiceField(queryset=User.objects.all(), label=_('Substitute'))
+    substitute = UserChoiceField(queryset=User.objects.all(), label=_('Substitute'))
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
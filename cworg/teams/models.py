@@ -1,17 +1,18 @@
 from django.db import models
-from django.db.models.signals import pre_save
+from django.db.models.signals import post_save, pre_save
 from django.contrib.auth.models import Group, User
 from django.utils.text import slugify
 from django.utils.safestring import mark_safe
-from common.constant import REST_KEYWORDS
+from common.cache import bump_row_version
+from common.models import ChangeTrackingMixin, SlugModelMixin
 
 from django.utils import timezone
 
-class Team(models.Model):
+class Team(ChangeTrackingMixin, SlugModelMixin, models.Model):
     #
     slug = models.SlugField(unique=True)
 
-    name = models.CharField(max_length=100, blank=True)
+    name = models.CharField(max_length=100, blank=True, db_index=True)
 
     # Password for joining the team
     join_password = models.CharField(max_length=40)
@@ -28,35 +29,36 @@ class Team(models.Model):
 
     def __str__(self):
         return self.name
+
+    def get_slug_base(self):
+        return slugify(self.name)
     pass
 
 
-def create_team_slug(instance, new_slug=None):
-    slug = slugify(instance.name)
-    if new_slug is not None:
-        slug = new_slug
-        pass
-    # If the slug is REST verbs, avoid the conflict.
-    exists = slug in REST_KEYWORDS
-    if not exists:
-        qs = Team.objects.filter(slug=slug).order_by("-id")
-        exists = qs.exists()
-        pass
-    if exists:
-        new_slug = "%s-%s" %(slug, qs.first().id)
-        return create_team_slug(instance, new_slug=new_slug)
-    return slug
+def create_team_slug(instance):
+    return instance.allocate_slug()
 
 
 def pre_save_team_receiver(sender, instance, *args, **kwargs):
     if not instance.slug:
         instance.slug = create_team_slug(instance)
         pass
+    # The row version is bumped once the row is written, see post_save.
+    instance._row_changed = instance.has_changed()
     pass
 
 pre_save.connect(pre_save_team_receiver, sender=Team)
 
 
+def post_save_team_receiver(sender, instance, created, *args, **kwargs):
+    if instance._row_changed and not created:
+        bump_row_version(sender, instance.pk)
+        pass
+    pass
+
+post_save.connect(post_save_team_receiver, sender=Team)
+
+
 class TeamMember(models.Model):
     member = models.ForeignKey(User, on_delete=models.CASCADE)
     team = models.ForeignKey(Team, on_delete=models.CASCADE)
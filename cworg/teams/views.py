@@ -1,4 +1,4 @@
-from django.shortcuts import render, get_object_or_404
+from django.shortcuts import render
 from django.http import HttpResponse, HttpResponseRedirect
 from django.template import loader
 from django.urls import reverse, NoReverseMatch
@@ -15,28 +15,16 @@ from common.views import ListModelView, DetailModelView, UpdateModelView, Create
 from common.sitemodule import module_registry
 from material import Layout, Row, Column, Fieldset
 
-from userprofile.models import UserProfile
+from userprofile.models import UserProfile, prime_display_names
+from userprofile.forms import UserChoiceField
 from django.db.models import Q
+import six
 
 from cwlog import logger
 
-from common.views.list import ModelAttr
+from common.views.list import batched
 from .apps import TeamsConfig
 
-class RelatedAttr(ModelAttr):
-    def __init__(self, model, name, callback, label=None):  # noqa D102
-        super().__init__(model, name, label=label)
-        self.callback = callback
-        pass
-
-    def get_value(self, obj):  # noqa D102
-        return self.callback(self, obj)
-
-    def get_formatted_string(self, obj):  # noqa D102
-        return self.callback(self, obj)
-
-    pass
-
 class TeamListView(ListModelView):
     """
     List of all teams, or create a new team.
@@ -47,6 +35,10 @@ class TeamListView(ListModelView):
     allow_empty = True
 
     list_display = ["name", "owner", "description", "joined"]
+    search_fields = ["name"]
+    row_cache = True
+    # The owner is shown by the display name of the user profile
+    row_cache_models = [TeamMember, UserProfile]
 
     def __init__(self, *args, **kwargs):
         super(TeamListView, self).__init__(*args, **kwargs)
@@ -87,11 +79,22 @@ class TeamListView(ListModelView):
             pass
         pass
     
-    def get_data_attr(self, attr_name):
-        if attr_name != "joined":
-            return super().get_data_attr(attr_name)
-        user = self.request.user
-        return RelatedAttr(self.object_list.model, attr_name, lambda attr, team: TeamMember.objects.filter(team__id=team.id, member__id=user.id).count()>0)
+    @batched
+    def joined(self, teams):
+        """Whether the user is a member, for a page of teams."""
+        joined = set(TeamMember.objects.filter(team__in=[team.pk for team in teams],
+                                               member__id=self.request.user.id)
+                     .values_list('team_id', flat=True))
+        return {team.pk: team.pk in joined for team in teams}
+
+    def prepare_items(self, items):
+        super().prepare_items(items)
+        prime_display_names([item.owner_id for item in items])
+        pass
+
+    def get_row_cache_role(self):
+        """The `joined` column is rendered for the user."""
+        return (super().get_row_cache_role(), self.request.user.pk)
 
     def has_view_permission(self, request):
         return request.user.is_authenticated
@@ -126,6 +129,7 @@ class TeamDetailForm(forms.ModelForm):
     class Meta:
         model = Team
         fields = ['name', 'join_password', 'description', 'owner']
+        field_classes = {'owner': UserChoiceField}
         pass
 
 
@@ -221,24 +225,25 @@ class TeamMemberListView(ListModelView):
     allow_empty = True
     list_display = ["member"]
     template_name = 'team/member_list.html'
+    # The members are shown by the display name of the user profile
+    row_cache_models = [UserProfile]
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        team_slug = self.kwargs.get('slug')
-        team = get_object_or_404(Team, slug=team_slug)
-        if team:
-            context['team'] = team
-            pass
+        context['team'] = self.get_url_object(Team)
         return context
 
     def get_queryset(self):
         """
         Get the team members of team.
         """
-        team_slug = self.kwargs.get('slug')
-        team = get_object_or_404(Team, slug=team_slug)
         queryset = super().get_queryset()
-        return queryset.filter(team=team)
+        return queryset.filter(team=self.get_url_object(Team))
+
+    def prepare_items(self, items):
+        super().prepare_items(items)
+        prime_display_names([item.member_id for item in items])
+        pass
 
     def has_view_permission(self, request):
         return request.user.is_authenticated
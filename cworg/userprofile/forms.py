@@ -1,4 +1,5 @@
 from django import forms
+from django.forms.models import ModelChoiceIterator
 from django.contrib.auth import (
     authenticate,
     get_user_model,
@@ -6,9 +7,38 @@ from django.contrib.auth import (
     logout,
     )
 
+from .models import prime_display_names
+
 
 User = get_user_model()
 
+
+class UserChoiceIterator(ModelChoiceIterator):
+    """Choices of the users, with the display names loaded at once."""
+
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ("", self.field.empty_label)
+            pass
+        queryset = self.queryset
+        if not queryset._prefetch_related_lookups:
+            queryset = queryset.iterator()
+            pass
+        users = list(queryset)
+        prime_display_names([user.pk for user in users])
+        for user in users:
+            yield self.choice(user)
+            pass
+        pass
+
+    pass
+
+
+class UserChoiceField(forms.ModelChoiceField):
+    """Model choice field of the users."""
+    iterator = UserChoiceIterator
+    pass
+
 class UserLoginForm(forms.Form):
     username = forms.CharField()
     password = forms.CharField(widget=forms.PasswordInput)
@@ -1,8 +1,14 @@
+import threading
+
 from django.db import models
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.core.cache import cache
+from django.core.signals import request_started
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
+from common.cache import is_cache_shared
+
 #from meets.models import Meet, Attendee
 #from teams.models import Team, TeamMember
 
@@ -28,11 +34,7 @@ class UserProfile(models.Model):
 
     @property
     def display_name(self):
-        if self.fullname:
-            return self.fullname
-        if self.user.first_name or self.user.last_name:
-            return "{} {}".format(self.user.first_name, self.user.last_name)
-        return self.user.username
+        return make_display_name(self.user.username, self.user.first_name, self.user.last_name, self.fullname)
 
     pass
 
@@ -43,12 +45,109 @@ def upsert_user_profile(sender, instance, created, **kwargs):
     instance.userprofile.save()
     pass
 
+# Display names of the users.
+#
+# The names are kept in the django cache when it is shared by the
+# workers, and the names used by the current request are kept in a
+# thread local dict as well, which is emptied when a request starts.
+# Both are forgotten when the user or the user profile is saved or
+# deleted.
+
+DISPLAY_NAME_KEY = 'cworg:display-name:{}'
+DISPLAY_NAME_TIMEOUT = 3600
+
+_request_names = threading.local()
+
+
+def _get_request_names():
+    names = getattr(_request_names, 'names', None)
+    if names is None:
+        names = _request_names.names = {}
+        pass
+    return names
+
+
+def make_display_name(username, first_name, last_name, fullname):
+    if fullname:
+        return fullname
+    if first_name or last_name:
+        return "{} {}".format(first_name, last_name)
+    return username
+
+
+def prime_display_names(user_ids):
+    """Load the display names of the users, and return them by the user pk.
+
+    The names missing from the request and the django cache are read
+    with one query.
+    """
+    names = _get_request_names()
+    user_ids = set(pk for pk in user_ids if pk is not None)
+    missing = [pk for pk in user_ids if pk not in names]
+    if missing and is_cache_shared():
+        keys = {DISPLAY_NAME_KEY.format(pk): pk for pk in missing}
+        for key, name in cache.get_many(list(keys)).items():
+            names[keys[key]] = name
+            pass
+        missing = [pk for pk in missing if pk not in names]
+        pass
+    if missing:
+        found = {}
+        rows = User.objects.filter(pk__in=missing).values_list(
+            'pk', 'username', 'first_name', 'last_name', 'userprofile__fullname')
+        for pk, username, first_name, last_name, fullname in rows:
+            found[pk] = make_display_name(username, first_name, last_name, fullname)
+            pass
+        if is_cache_shared():
+            cache.set_many({DISPLAY_NAME_KEY.format(pk): name for pk, name in found.items()}, DISPLAY_NAME_TIMEOUT)
+            pass
+        names.update(found)
+        pass
+    return {pk: names[pk] for pk in user_ids if pk in names}
+
+
+def forget_display_name(user_id):
+    """Forget the display name of the user."""
+    _get_request_names().pop(user_id, None)
+    if is_cache_shared():
+        cache.delete(DISPLAY_NAME_KEY.format(user_id))
+        pass
+    pass
+
+
+@receiver(request_started)
+def reset_request_display_names(sender, **kwargs):
+    _request_names.names = {}
+    pass
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_display_name_receiver(sender, instance, **kwargs):
+    forget_display_name(instance.pk)
+    pass
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def profile_display_name_receiver(sender, instance, **kwargs):
+    forget_display_name(instance.user_id)
+    pass
+
+
 def get_user_display_name(self):
-    userprof = UserProfile.objects.get(user=self)
-    if userprof:
-        return userprof.display_name
-    if self.first_name or self.last_name:
-        return "{} {}".format(self.first_name, self.last_name)
-    return self.username
+    if self.pk is None:
+        return make_display_name(self.username, self.first_name, self.last_name, '')
+    if User.userprofile.is_cached(self):
+        # The profile is loaded with the user (select_related)
+        profile = User.userprofile.related.get_cached_value(self)
+        fullname = profile.fullname if profile is not None else ''
+        name = make_display_name(self.username, self.first_name, self.last_name, fullname)
+        _get_request_names()[self.pk] = name
+        return name
+    name = prime_display_names([self.pk]).get(self.pk)
+    if name is None:
+        return make_display_name(self.username, self.first_name, self.last_name, '')
+    return name
 
 User.add_to_class("__str__", get_user_display_name)